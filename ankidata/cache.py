@@ -0,0 +1,99 @@
+import json
+import sqlite3
+import threading
+
+# Increase when the parsing of notes changes, the cache is then rebuilt
+PARSER_VERSION = 4
+
+
+class QuestionCache:
+    def __init__(self, path):
+        """Initializes the QuestionCache object.
+
+        The cache keeps the parsed questions of notes on disk, keyed by note id and
+        valid while the note modification time and usn do not change.
+
+        Args:
+            path (str): Path of the cache file
+        """
+        self.path = path
+        self.db = None
+        self.lock = threading.Lock()
+
+    def open(self) -> bool:
+        """Opens the cache file, creating it if needed.
+
+        Returns:
+            bool: True if success, False if the file cannot be opened
+        """
+        if self.db != None:
+            return True
+        try:
+            self.db = sqlite3.connect(
+                self.path, timeout=5, check_same_thread=False)
+            self.db.execute(
+                "create table if not exists meta (key text primary key, value integer)")
+            self.db.execute(
+                "create table if not exists notes (nid integer primary key, mod integer, usn integer, parsed text)")
+            version = self.db.execute(
+                "select value from meta where key = 'version'").fetchone()
+            if version == None or version[0] != PARSER_VERSION:
+                self.db.execute("delete from notes")
+                self.db.execute(
+                    "insert or replace into meta values ('version', ?)", (PARSER_VERSION,))
+            self.db.commit()
+        except sqlite3.Error:
+            self.db = None
+            return False
+        return True
+
+    def get(self, notes) -> dict:
+        """Returns the cached entries of the notes.
+
+        Args:
+            notes (list): Notes ids
+
+        Returns:
+            dict: Note id to [mod, usn, parsed, errors]
+        """
+        if self.open() == False:
+            return {}
+        entries = {}
+        with self.lock:
+            try:
+                for start in range(0, len(notes), 500):
+                    batch = notes[start:start+500]
+                    rows = self.db.execute(
+                        f"select nid, mod, usn, parsed from notes where nid in ({','.join('?'*len(batch))})", batch)
+                    for nid, mod, usn, parsed in rows:
+                        entries[nid] = [mod, usn] + json.loads(parsed)
+            except sqlite3.Error:
+                return {}
+        return entries
+
+    def put(self, entries):
+        """Stores the parsed questions of the notes.
+
+        Args:
+            entries (list): List of [nid, mod, usn, parsed, errors]
+        """
+        if len(entries) == 0 or self.open() == False:
+            return
+        with self.lock:
+            try:
+                self.db.executemany(
+                    "insert or replace into notes values (?, ?, ?, ?)",
+                    [(nid, mod, usn, json.dumps([parsed, errors], ensure_ascii=False, separators=(',', ':')))
+                     for nid, mod, usn, parsed, errors in entries])
+                self.db.commit()
+            except sqlite3.Error:
+                # the cache is shared by processes, a busy cache is skipped
+                self.db.rollback()
+
+    def close(self):
+        """Closes the cache file.
+        """
+        with self.lock:
+            if self.db != None:
+                self.db.close()
+                self.db = None
@@ -1,96 +1,209 @@
-from anki.collection import Collection
+from ankidata.cache import QuestionCache
+from ankidata.media import ImageCache, ImageHandle, MediaIndex
+from ankidata.profiles import ProfileLocator, ankiBaseDir
+from ankidata.readonly import ReadOnlyCollection
+from ankidata.snapshot import Snapshot
+from ankidata.session import Session
+from ankidata.store import QuestionStore
+from ankidata import grading, text, trace
+import itertools
 import os
-import base64
-import re
 import random
+import threading
 # Update this variable with the name of your model if you want to use another model
 MODEL_NAME = "Test by MX"
+# Number of notes read from the collection in one query
+BATCH_SIZE = 200
+# Maximum size of images kept in memory, in bytes
+IMAGE_CACHE_SIZE = 64*1024*1024
+# Images bigger than this are memory-mapped instead of cached, in bytes
+MMAP_THRESHOLD = 4*1024*1024
+# Suffix of the file with parsed questions, stored next to collection.anki2
+QUESTION_CACHE_SUFFIX = ".ankitest.db"
+
+
+def _ids2str(ids) -> str:
+    """Returns the ids as a SQL list, as anki.utils.ids2str does without importing anki.
+
+    Args:
+        ids (list): Ids
+
+    Returns:
+        str: SQL list, for example (1,2,3)
+    """
+    return "("+",".join(str(int(i)) for i in ids)+")"
+
+
+def _drawNotes(notes, rand):
+    """Yields the notes in random order without repetition, the cost grows with the number of drawn notes.
+
+    Args:
+        notes (list): Notes ids
+        rand (random.Random): Random generator
+
+    Yields:
+        int: Note id
+    """
+    chosen = set()
+    while len(chosen) < len(notes)//2:
+        i = rand.randrange(len(notes))
+        if i in chosen:
+            continue
+        chosen.add(i)
+        yield notes[i]
+    # most notes are drawn, the rest is shuffled instead
+    rest = [notes[i] for i in range(len(notes)) if i not in chosen]
+    rand.shuffle(rest)
+    yield from rest
 
 
 class Deck:
-    def __init__(self, name, AnkiCore):
+    def __init__(self, name, AnkiCore, sample=None, seed=None):
         """Initializes the Deck object.
 
         Args:
             name (str): Name of the deck
+            sample (int, optional): Number of questions drawn at random, only their notes are loaded.
+                Defaults to None, all questions.
+            seed (int, optional): Seed of the draw, the same seed draws the same questions. Defaults to a random seed.
         """
         self.name = name
         self.AnkiCore = AnkiCore
-        self.cards = []
+        self.sample = sample
+        # the seed is kept so the draw can be repeated
+        self.seed = seed if seed != None or sample == None else random.randrange(2**32)
+        self.notes = []
         self.deckWithModel = False
-        self.questions = []
-        self.answers = []
-        self.correct = []
-        self.images = []
-        self.index = 0
-        self.score = 0
-        self.wrongQuestions = []
+        # questions, answers, correct and images are read-only columns of the store
+        self.store = QuestionStore()
+        self.questions = self.store.questions
+        self.answers = self.store.answers
+        self.correct = self.store.correct
+        self.images = self.store.images
         self.errors = []
         self.questionsNum = 0
         self.loaded = False
+        self.loader = None
+        # sessions on other threads load more of the deck, the loader runs on one thread at a time
+        self.loadLock = threading.Lock()
+        # the quiz methods of Deck use this session, the questions are only read
+        self.session = Session(self)
 
-    def loadCard(self) -> int:
+    def loadCard(self, wait=True) -> int:
         """Loads the deck and returns the status of the loading.
 
+        Args:
+            wait (bool, optional): If False only the first batch of questions is loaded,
+                the rest is loaded by loadMore. Defaults to True.
+
         Returns:
             int: 0 if success, -1 if deck not found, -2 if no cards found
         """
-        if self.name not in self.AnkiCore.decksNames:
-            return -1
-        # find cards in deck
-        cards = self.AnkiCore.collection.find_cards(f'deck:"{self.name}"')
-        # find model of cards
-        for card in cards:
-            model = self.AnkiCore.collection.get_card(card).note_type()['name']
-            # if model is "Test by MX" add card to list
-            if model == self.AnkiCore.model:
-                self.cards.append(card)
-        if len(self.cards) == 0:
-            return -2
-        if self._loadQuestions(self.name) == -1:
-            return -2
-        self.loaded = True
-        return 0
+        with trace.span("Deck.loadCard") as span:
+            if self.name not in self.AnkiCore.decksNames:
+                return -1
+            # find notes of the model in deck and its subdecks
+            self.notes = self._findNotes()
+            span.count("notes", len(self.notes))
+            if len(self.notes) == 0:
+                return -2
+            self.loader = self.streamQuestions()
+            while self.loader != None and (wait or self.questionsNum == 0):
+                self.loadMore()
+            span.count("cards", self.questionsNum)
+            if self.questionsNum == 0:
+                return -2
+            self.loaded = True
+            return 0
+
+    def loadMore(self, batches=1) -> bool:
+        """Loads the next batches of questions.
 
-    def shuffle(self):
-        """Shuffles the current question.
+        Args:
+            batches (int, optional): Number of batches to load. Defaults to 1.
+
+        Returns:
+            bool: True if there are more questions to load
         """
-        if self.loaded == False:
-            return
+        with self.loadLock:
+            for _ in range(batches*BATCH_SIZE):
+                if self.loader == None:
+                    return False
+                if next(self.loader, None) == None:
+                    self.loader = None
+            return self.loader != None
 
-        oldAnswers = self.answers[self.index]
-        oldCorrect = self.correct[self.index]
+    def isFullyLoaded(self) -> bool:
+        """Returns True if all questions of the deck are loaded.
 
-        answersWithCorrect = []
-        for i in range(len(oldAnswers)):
-            if i in oldCorrect:
-                answersWithCorrect.append([oldAnswers[i], True])
-            else:
-                answersWithCorrect.append([oldAnswers[i], False])
+        Returns:
+            bool: True if all questions are loaded
+        """
+        return self.loaded and self.loader == None
+
+    def streamQuestions(self):
+        """Reads the notes in batches and yields the parsed questions.
 
-        random.shuffle(answersWithCorrect)
+        Every parsed question is added to the deck before it is yielded.
 
-        newAnswers = [answersWithCorrect[i][0]
-                      for i in range(len(answersWithCorrect))]
-        newCorrect = []
-        for i in range(len(answersWithCorrect)):
-            if answersWithCorrect[i][1] == True:
-                newCorrect.append(i)
+        Yields:
+            list: [question, answers, correct, images]
+        """
+        for notes in self._noteBatches():
+            for parsed, errors in self._readQuestions(notes):
+                self.errors.extend(errors)
+                if parsed == None:
+                    continue
+                [question, answers, correct, images] = parsed
+                images = self._findImages(images)
+                parsed = [question, answers, correct, images]
+                self.store.append(question, answers, correct, images)
+                self.questionsNum = len(self.store)
+                yield parsed
+
+    def _noteBatches(self):
+        """Yields the lists of notes to read, the drawn notes if the deck is sampled.
+
+        Yields:
+            list: Notes ids
+        """
+        if self.sample == None:
+            yield self.notes
+            return
+        draw = _drawNotes(self.notes, random.Random(self.seed))
+        while self.questionsNum < self.sample:
+            # notes that are not valid questions are replaced by more drawn notes
+            notes = list(itertools.islice(draw, self.sample-self.questionsNum))
+            if len(notes) == 0:
+                return
+            yield notes
+
+    def iterRecords(self):
+        """Yields the questions of the deck one at a time, loading the rest of the deck when needed.
+
+        Yields:
+            list: [question, answers, correct, images] where images are ImageHandle
+        """
+        index = 0
+        while True:
+            while index >= self.questionsNum and self.loader != None:
+                self.loadMore()
+            if index >= self.questionsNum or self.loaded == False:
+                return
+            yield [self.questions[index], self.answers[index], self.correct[index], self.getImages(index)]
+            index += 1
 
-        self.answers[self.index] = newAnswers
-        self.correct[self.index] = newCorrect
+    def shuffle(self):
+        """Kept for compatibility, the answers are shuffled once per question by the session.
+        """
 
     def nextQuestion(self):
-        """Returns the next question and the status of the loading.
+        """Moves to the next question of the default session, see Session.nextQuestion.
+
         Returns:
             int: 0 if success, -1 if no more questions, -2 if deck not loaded
         """
-        if self.index >= self.questionsNum-1:
-            return -1
-        if self.loaded == False:
-            return -2
-        self.index += 1
-        return 0
+        return self.session.nextQuestion()
 
     def getErrors(self) -> list:
         """Returns the errors.
@@ -101,93 +214,102 @@ class Deck:
         return self.errors
 
     def getQuestion(self) -> str:
-        """Returns the question.
+        """Returns the question of the default session.
 
         Returns:
             str: Question
             str: "" if no more questions or deck not loaded
         """
-        if self.index >= self.questionsNum:
-            return ""
-        if self.loaded == False:
-            return ""
-        return self.questions[self.index],
+        return self.session.getQuestion()
 
     def getAnswers(self) -> list:
-        """Returns the answers.
+        """Returns the shuffled answers of the default session.
 
         Returns:
             list: Answers
             list: [] if no more questions or deck not loaded
         """
-        if self.index >= self.questionsNum:
-            return []
-        if self.loaded == False:
-            return []
-        return self.answers[self.index]
+        return self.session.getAnswers()
 
-    def getImages(self) -> list:
-        """Returns the images.
+    def getImages(self, index=None) -> list:
+        """Returns the images, their content is loaded from the media folder when needed.
+
+        Args:
+            index (int, optional): Index of the question. Defaults to the current question.
 
         Returns:
-            list: Images
+            list: Images as ImageHandle
             list: [] if no more questions or deck not loaded
         """
-        if self.index >= self.questionsNum:
+        if index == None:
+            index = self.session.questionIndex()
+        if index >= self.questionsNum:
             return []
         if self.loaded == False:
             return []
-        return self.images[self.index]
+        return self._getImageHandles(self.images[index])
 
     def updateScore(self, answers) -> int:
-        if self.loaded == False:
-            return -1
-        if self.index >= self.questionsNum:
-            return -2
-        point = False
-        for answer in answers:
-            if answer not in self.correct[self.index]:
-                point = False
-                break
-            if answer in self.correct[self.index]:
-                point = True
-        if point == True:
-            self.score += 1
-        else:
-            self.wrongQuestions.append(self.questions[self.index])
-        return 0
+        """Grades the answers of the current question of the default session.
+
+        Args:
+            answers (list): Indexes of selected answers, as returned by getAnswers
+
+        Returns:
+            int: 0 if success, -1 if deck not loaded, -2 if no more questions
+        """
+        return self.session.updateScore(answers)
+
+    def getAnswerKeys(self) -> list:
+        """Returns the correct answers of the loaded questions as bitmasks.
+
+        Returns:
+            list: Bitmask of correct answers of every question, see ankidata.grading
+        """
+        return list(self.store.correctMasks)
+
+    def gradeSessions(self, sheets) -> list:
+        """Grades many answer sheets of this deck at once.
+
+        Args:
+            sheets (list): Answer sheets, lists of bitmasks of selected answers of every question
+
+        Returns:
+            list: Score of every sheet
+        """
+        return grading.gradeSessions(self.store.correctMasks, sheets)
 
     def getScore(self) -> int:
-        """Returns the score.
+        """Returns the score of the default session.
 
         Returns:
             int: Score
         """
-        return self.score
+        return self.session.getScore()
 
     def getMaxScore(self) -> int:
-        """Returns the maximum score.
+        """Returns the maximum score of the default session.
 
         Returns:
             int: Maximum score
         """
-        return self.questionsNum
+        return self.session.getMaxScore()
 
     def getScorePercentage(self) -> float:
-        """Returns the score percentage.
+        """Returns the score percentage of the default session.
 
         Returns:
             float: Score percentage
         """
-        return round(self.score/self.questionsNum*100, 2)
+        return self.session.getScorePercentage()
 
     def getWrongQuestions(self) -> list:
-        """Returns the wrong questions.
+        """Returns the wrong questions of the default session.
 
         Returns:
             list: Wrong questions
         """
-        return self.wrongQuestions
+        return self.session.getWrongQuestions()
 
     def getDeckName(self) -> str:
         """Returns the deck name.
@@ -206,12 +328,12 @@ class Deck:
         return self.questionsNum
 
     def getQuestionIndex(self) -> int:
-        """Returns the index of the question.
+        """Returns the index of the question of the default session.
 
         Returns:
             int: Index of the question
         """
-        return self.index
+        return self.session.getQuestionIndex()
 
     def isLoaded(self) -> bool:
         """Returns the status of the loading.
@@ -221,129 +343,196 @@ class Deck:
         """
         return self.loaded
 
-    def _loadQuestions(self, deckName) -> int:
-        """Loads the questions and returns the status of the loading.
-
-        Returns:
-            int:  0 if success, -1 if no cards found
-        """
-        questions = []
-        answers = []
-        correct = []
-        images = []
-        errors = []
-        for card in self.cards:
-            note = self.AnkiCore.collection.get_card(card).note()
-            fields_num = len(note.fields)
-            question = note.fields[0]
-            [question, imgsrc] = self.findImages(question)
-            answer = note.fields[1:fields_num-1]
-            answer = [x for x in answer if x != ""]
-            correct = note.fields[fields_num-1]
-            imgbase64 = self._getImage64(imgsrc)
-            if (len(correct) == 0) or (len(answer) == 0) or (len(question) == 0):
-                if len(question) != 0:
-                    errors.append(question)
-                else:
-                    errors.append("Unknown, cannot show question")
+    @trace.traced("Deck.findNotes")
+    def _findNotes(self) -> list:
+        """Finds the notes of the model in the deck and its subdecks with one query.
+
+        Returns:
+            list: Notes ids, every note only once
+        """
+        deckIds = _ids2str(self.AnkiCore.getDeckIds(self.name))
+        return self.AnkiCore.collection.db.list(
+            f"select distinct nid from cards where (did in {deckIds} or odid in {deckIds}) "
+            "and nid in (select id from notes where mid = ?) order by nid", self.AnkiCore.modelId)
+
+    def _readQuestions(self, notes):
+        """Reads the notes in batches and parses them, using the question cache.
+
+        Only notes changed since they were cached are read from the collection.
+
+        Args:
+            notes (list): Notes ids
+
+        Yields:
+            list: [parsed, errors] where parsed is [question, answers, correct, images] or None
+        """
+        cache = self.AnkiCore.getQuestionCache()
+        for start in range(0, len(notes), BATCH_SIZE):
+            batch = notes[start:start+BATCH_SIZE]
+            if cache == None:
+                for fields in self._normalizeBatch(list(self._readNotes(batch).values())):
+                    yield self._parseNoteWithErrors(fields)
                 continue
-            self.correct.append(self._correctToIndex(correct))
-            self.questions.append(self._clearString(question))
-            self.answers.append(self._clearString(answer))
-            self.images.append(imgbase64)
-        self.questionsNum = len(self.questions)
-        if len(self.questions) == 0:
-            return -1
-        return 0
+            versions = {nid: [mod, usn] for nid, mod, usn in self.AnkiCore.collection.db.all(
+                f"select id, mod, usn from notes where id in {_ids2str(batch)}")}
+            with trace.span("QuestionCache.get", notes=len(batch)) as span:
+                cached = cache.get(batch)
+                span.count("hits", len(cached))
+            changed = [nid for nid in batch if nid in versions and (
+                nid not in cached or cached[nid][:2] != versions[nid])]
+            fields = self._readNotes(changed)
+            fields = dict(zip(fields.keys(), self._normalizeBatch(
+                list(fields.values()))))
+            entries = []
+            for nid in batch:
+                if nid in fields:
+                    [parsed, errors] = self._parseNoteWithErrors(fields[nid])
+                    entries.append([nid] + versions[nid] + [parsed, errors])
+                    yield [parsed, errors]
+                elif nid in cached:
+                    yield cached[nid][2:]
+            with trace.span("QuestionCache.put", notes=len(entries)):
+                cache.put(entries)
+
+    @trace.traced("Deck.readNotes")
+    def _readNotes(self, notes) -> dict:
+        """Reads the fields of the notes with one query.
+
+        Args:
+            notes (list): Notes ids
+
+        Returns:
+            dict: Note id to fields of the note joined by text.FIELD_SEPARATOR, in the order of notes
+        """
+        if len(notes) == 0:
+            return {}
+        rows = self.AnkiCore.collection.db.all(
+            f"select id, flds from notes where id in {_ids2str(notes)}")
+        fields = {nid: flds for nid, flds in rows}
+        return {nid: fields[nid] for nid in notes if nid in fields}
+
+    def _normalizeBatch(self, notes) -> list:
+        """Removes the HTML of the fields of the notes, see text.normalizeBatch.
+
+        Args:
+            notes (list): Fields of every note joined by text.FIELD_SEPARATOR
+
+        Returns:
+            list: Normalized fields of every note
+        """
+        with trace.span("text.normalizeBatch", notes=len(notes)):
+            return text.normalizeBatch(notes)
+
+    def _parseNoteWithErrors(self, fields) -> list:
+        """Parses the fields of the note and returns the errors found.
+
+        Args:
+            fields (list): Normalized fields of the note
+
+        Returns:
+            list: [parsed, errors]
+        """
+        errors = self.errors
+        self.errors = []
+        try:
+            parsed = self._parseNote(fields)
+            return [parsed, self.errors]
+        finally:
+            self.errors = errors
+
+    def _parseNote(self, fields) -> list:
+        """Parses the fields of the note.
+
+        Args:
+            fields (list): Fields of the note normalized by text.normalizeBatch
+
+        Returns:
+            list: [question, answers, correct, images names]
+            None: if the note is not a valid question, it is added to errors
+        """
+        fields_num = len(fields)
+        [question, imgsrc] = fields[0]
+        answer = [x[0] for x in fields[1:fields_num-1]]
+        answer = [x for x in answer if x != ""]
+        correct = fields[fields_num-1][0]
+        if (len(correct) == 0) or (len(answer) == 0) or (len(question) == 0):
+            if len(question) != 0:
+                self.errors.append(question)
+            else:
+                self.errors.append("Unknown, cannot show question")
+            return None
+        mask = self._correctToIndex(correct)
+        # a key without answers or with letters past the last answer cannot be graded
+        if mask == 0 or mask >> len(answer) != 0:
+            self.errors.append(question)
+            return None
+        return [question, answer, mask, imgsrc]
 
     def _clearString(self, string) -> str:
         """Clears the string from HTML tags and returns the cleared string.
 
         Args:
-            string (str): String to clear
+            string (str): String or list of strings to clear
 
         Returns:
-            str: Cleared string
+            str: Cleared string, or a new list of cleared strings
         """
         if isinstance(string, list):
-            for i in range(len(string)):
-                string[i] = self._clearString(string[i])
-            return string
-
-        string = string.replace("<br>", "\n")
-        string = string.replace("<br/>", "\n")
-        string = string.replace("<br />", "\n")
-        string = string.replace("<br >", "\n")
-        string = string.replace("&nbsp;", " ")
-        string = string.replace("&lt;", "<")
-        string = string.replace("&gt;", ">")
-        string = string.replace("&amp;", "&")
-        string = string.replace("&quot;", "\"")
-        string = string.replace("&apos;", "'")
-        string = string.replace("&cent;", "¢")
-        string = string.replace("&pound;", "£")
-        string = string.replace("&yen;", "¥")
-        string = string.replace("&euro;", "€")
-        string = string.replace("&copy;", "©")
-        string = string.replace("&reg;", "®")
-        string = string.replace("&trade;", "™")
-        string = string.replace("&times;", "×")
-        string = string.replace("&divide;", "÷")
-        string = string.replace("&ndash;", "–")
-        string = string.replace("&mdash;", "—")
-        string = string.replace("&lsquo;", "‘")
-        string = string.replace("&rsquo;", "’")
-        string = string.replace("&sbquo;", "‚")
-        string = string.replace("&ldquo;", "“")
-        string = string.replace("&rdquo;", "”")
-        string = string.replace("&bdquo;", "„")
-        string = string.replace("&laquo;", "«")
-        string = string.replace("&raquo;", "»")
-        return string
-
-    def _correctToIndex(self, correct) -> list:
-        """Converts the correct answer to an index.
+            return [self._clearString(x) for x in string]
+        return text.normalize(string)[0]
+
+    def _correctToIndex(self, correct) -> int:
+        """Converts the correct answer to a bitmask of indexes.
             Args:
-                correct (str): Correct answer
+                correct (str): Correct answer, for example "ABCgEf"
             Returns:
-                list: List of index
+                int: Bitmask, bit i is set if answer i is correct
         """
-        # Correct input is for example "ABCgEf"
-        correct = correct.upper()
-        correct = correct.replace(" ", "")
-        correctExploded = list(correct)
-        correctIndex = []
-        for letter in correctExploded:
-            correctIndex.append(ord(letter)-65)
-        return correctIndex
+        return grading.parseKey(correct)
 
-    def _getImage64(self, images) -> list:
-        """Loads and adds the images to the question.
+    def _findImages(self, images) -> list:
+        """Returns the images that exist in the media folder.
 
         Args:
-            images (list): List of images
-        Returns:
-            list: List of images in base64
-        """
-        srcs = []
-        # find image in anki
-        for image in images:
-            # find image in anki
-            directory = self.AnkiCore.collection.media.dir()
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    if file.endswith(image):
-                        srcs.append(os.path.join(root, file))
-
-        # load images and change them to base64
-        images64 = []
-        for src in srcs:
-            with open(src, 'rb') as f:
-                data = f.read()
-            images64.append(base64.b64encode(data).decode('utf-8'))
-        if len(images64) == 0:
-            return [None]
-        return images64
+            images (list): List of images names
+        Returns:
+            list: List of images names found in the media folder
+        """
+        if len(images) == 0:
+            return []
+        with trace.span("Deck.findImages", images=len(images)):
+            found = []
+            media = self.AnkiCore.getMediaIndex()
+            for image in images:
+                if media.path(image) == None:
+                    self.errors.append(f"Image not found: {image}")
+                    continue
+                found.append(image)
+            return found
+
+    def _getImageHandles(self, images) -> list:
+        """Returns the handles of the images of the question.
+
+        Args:
+            images (list): List of images names
+        Returns:
+            list: List of ImageHandle
+        """
+        if len(images) == 0:
+            return []
+        with trace.span("Deck.getImageHandles") as span:
+            media = self.AnkiCore.getMediaIndex()
+            handles = []
+            for image in images:
+                src = media.path(image)
+                if src == None:
+                    continue
+                handles.append(ImageHandle(
+                    image, src, self.AnkiCore.getImageCache(), MMAP_THRESHOLD))
+            if span.enabled:
+                span.count("images", len(handles))
+                span.count("bytes", sum(handle.size() for handle in handles))
+            return handles
 
     def findImages(self, question) -> list:
         """Finds the images in the questions and returns the status of the finding.
@@ -351,38 +540,63 @@ class Deck:
         Returns:
             list: [question, images]
         """
-        images = []
-        # find images in question
-        pattern = r'<img src="([^"]+)"'
-        for match in re.finditer(pattern, question):
-            images.append(match.group(1))
-
-        question = self.AnkiCore.collection.media.strip(question)
-        return [question, images]
+        return text.normalize(question)
 
 
 class AnkiCore:
-    def __init__(self, model=MODEL_NAME):
+    def __init__(self, model=MODEL_NAME, imageCacheSize=IMAGE_CACHE_SIZE, questionCache=True, collectionPath=None, readOnly=False,
+                 profile=None, snapshot=False):
         """Initializes the AnkiCore object.
 
         Args:
             model (_type_, optional): Model name. Defaults to MODEL_NAME.
+            imageCacheSize (int, optional): Maximum size of loaded images in bytes. Defaults to IMAGE_CACHE_SIZE.
+            questionCache (bool, optional): Keep parsed questions on disk next to the collection. Defaults to True.
+            collectionPath (str, optional): Path of collection.anki2. Defaults to the collection of the profile.
+            readOnly (bool, optional): Open the collection read-only with SQLite instead of the Anki backend,
+                many processes can do it at the same time. Defaults to False.
+            profile (str, optional): Anki profile. Defaults to the profile used last, see ProfileLocator.
+            snapshot (bool, optional): Read a snapshot of the collection shared by all processes, Anki can stay
+                open. Implies readOnly. Defaults to False.
         """
         self.model = model
+        self.collectionPath = collectionPath
+        self.profile = profile
+        self.readOnly = readOnly or snapshot
+        self.snapshot = snapshot
+        self.imageCache = ImageCache(imageCacheSize)
         self.collection = None
         self.decksNames = None
         self.decksWithModel = None
+        self.decksQuestionsNum = None
+        self.decksIds = None
+        self.modelId = None
+        self.media = None
+        self.useQuestionCache = questionCache
+        self.questionCache = None
         self.init = False
 
-    def Init(self) -> int:
+    @trace.traced("AnkiCore.Init")
+    def Init(self, progress=None, cancel=None) -> int:
         """Initializes the AnkiCore object and returns the status of the initialization.
 
+        Args:
+            progress (function, optional): Called with the name of every stage of the initialization
+            cancel (threading.Event, optional): Stops the initialization when set
+
         Returns:
-            int: 0 if success, -1 if path not found, -2 if collection not found, -3 if error while opening collection, -4 if no decks found
+            int: 0 if success, -1 if path not found, -2 if collection not found, -3 if error while opening collection, -4 if no decks found, -5 if cancelled
         """
-        out = self._connectAnkiDB()
-        if out == 0:
-            self.init = True
+        out = self._connectAnkiDB(progress, cancel)
+        if out == 0 and cancel != None and cancel.is_set():
+            self.collection.close()
+            self.collection = None
+            out = -5
+        if out != 0:
+            return out
+        self.init = True
+        if progress != None:
+            progress("Discovering decks")
         if self._loadSupportedDecks() == -2:
             out = -4
         return out
@@ -395,69 +609,174 @@ class AnkiCore:
         """
         return self.decksNames
 
-    def getDeck(self, deckName) -> Deck:
+    def getMediaIndex(self) -> MediaIndex:
+        """Returns the media index of the collection, shared by all decks.
+
+        Returns:
+            MediaIndex: Media index
+        """
+        if self.media == None:
+            self.media = MediaIndex(self.collection.media.dir())
+            self.media.refresh()
+        return self.media
+
+    def getImageCache(self) -> ImageCache:
+        """Returns the cache of loaded images, shared by all decks.
+
+        Returns:
+            ImageCache: Image cache
+        """
+        return self.imageCache
+
+    def getQuestionCache(self) -> QuestionCache:
+        """Returns the cache of parsed questions, stored next to the collection.
+
+        Returns:
+            QuestionCache: Question cache
+            None: if the cache is disabled
+        """
+        if self.useQuestionCache == False:
+            return None
+        if self.questionCache == None:
+            self.questionCache = QuestionCache(
+                os.path.splitext(self.collection.path)[0]+QUESTION_CACHE_SUFFIX)
+        return self.questionCache
+
+    def getDeckIds(self, deckName) -> list:
+        """Returns the ids of the deck and its subdecks.
+
+        Args:
+            deckName (str): Deck name
+
+        Returns:
+            list: Decks ids
+        """
+        prefix = deckName+"::"
+        return [did for name, did in self.decksIds.items() if name == deckName or name.startswith(prefix)]
+
+    def getDeckQuestionsNum(self, deckName) -> int:
+        """Returns the number of questions of the model in the deck.
+
+        Args:
+            deckName (str): Deck name
+
+        Returns:
+            int: Number of questions, 0 if deck not found
+        """
+        if self.decksQuestionsNum == None:
+            return 0
+        return self.decksQuestionsNum.get(deckName, 0)
+
+    def getDeck(self, deckName, sample=None, seed=None) -> Deck:
         """Returns the deck.
 
         Args:
             deckName (str): Deck name
+            sample (int, optional): Number of questions drawn at random. Defaults to None, all questions.
+            seed (int, optional): Seed of the draw. Defaults to a random seed.
 
         Returns:
             Deck: Deck
         """
-        return Deck(deckName, self)
+        return Deck(deckName, self, sample, seed)
 
     def _loadSupportedDecks(self) -> int:
         """Loads the supported decks and returns the status of the loading.
 
+        The notetype id of the model is resolved once and the decks holding
+        notes of that notetype are found with a single aggregate query, so
+        the cost grows with the number of decks, not the number of cards.
+
         Returns:
             int: -1 if AnkiCore is not initialized, 0 if success, -2 if no decks found
         """
-        if self.init == False:
-            return -1
-        decks = self.collection.decks.all()
-        decks_with_model = []
-        for deck in decks:
-            # find cards in deck
-            cards = self.collection.find_cards(f'deck:"{deck["name"]}"')
-            # find model of cards
-            for card in cards:
-                model = self.collection.get_card(card).note_type()['name']
-                # if model is "Test by MX" add deck to list
-                if model == self.model:
-                    decks_with_model.append(deck)
-                    break
-        if len(decks_with_model) == 0:
-            return -2
-        # create list of decks names
-        decks_names = [deck['name'] for deck in decks_with_model]
-        self.decksWithModel = decks_with_model
-        self.decksNames = decks_names
-        return 0
-
-    def _connectAnkiDB(self) -> int:
+        with trace.span("AnkiCore.loadSupportedDecks") as span:
+            if self.init == False:
+                return -1
+            self.modelId = self.collection.models.id_for_name(self.model)
+            if self.modelId == None:
+                return -2
+            # count questions of the model per deck (and per original deck of
+            # cards moved to a filtered deck)
+            rows = self.collection.db.all(
+                "select did, odid, count(distinct nid) from cards "
+                "where nid in (select id from notes where mid = ?) "
+                "group by did, odid", self.modelId)
+            questions_in_deck = {}
+            for did, odid, count in rows:
+                for deck_id in (did, odid):
+                    if deck_id:
+                        questions_in_deck[deck_id] = questions_in_deck.get(
+                            deck_id, 0) + count
+            if len(questions_in_deck) == 0:
+                return -2
+            # deck:"name" search includes subdecks, so parents hold the questions
+            # of their children
+            decks = self.collection.decks.all()
+            ids_by_name = {deck['name']: deck['id'] for deck in decks}
+            questions_num = {}
+            for deck in decks:
+                count = questions_in_deck.get(deck['id'], 0)
+                if count == 0:
+                    continue
+                path = deck['name'].split("::")
+                for depth in range(1, len(path)+1):
+                    name = "::".join(path[:depth])
+                    if name in ids_by_name:
+                        questions_num[name] = questions_num.get(name, 0) + count
+            decks_with_model = [
+                deck for deck in decks if deck['name'] in questions_num]
+            # create list of decks names
+            decks_names = [deck['name'] for deck in decks_with_model]
+            self.decksIds = ids_by_name
+            self.decksWithModel = decks_with_model
+            self.decksNames = decks_names
+            self.decksQuestionsNum = questions_num
+            span.count("decks", len(decks_names))
+            return 0
+
+    @trace.traced("AnkiCore.connect")
+    def _connectAnkiDB(self, progress=None, cancel=None) -> int:
         """Connects to the Anki database and returns the status of the connection.
 
+        Args:
+            progress (function, optional): Called with the name of every stage
+            cancel (threading.Event, optional): Stops the connection when set
+
         Returns:
-            int: 0 if success, -1 if path not found, -2 if collection not found, -3 if error while opening collection
+            int: 0 if success, -1 if path not found, -2 if collection not found, -3 if error while opening collection, -5 if cancelled
         """
-        path = self._getAnkiPath()
-        if path == None:
-            return -1
-
-        # Find collection.anki2
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                if file.endswith('collection.anki2'):
-                    collection_path = os.path.join(root, file)
-                    break
+        collection_path = self.collectionPath
+        if collection_path == None:
+            if progress != None:
+                progress("Locating Anki profile")
+            path = self._getAnkiPath()
+            if path == None or not os.path.isdir(path):
+                return -1
+            # only prefs21.db and the profile folders are read, never the media folders
+            collection_path = ProfileLocator(path).collectionPath(self.profile)
+        elif not os.path.isfile(collection_path):
+            return -2
 
         # If collection.anki2 not found
-        if collection_path == '':
+        if collection_path == None:
             return -2
 
+        if cancel != None and cancel.is_set():
+            return -5
+        if progress != None:
+            progress("Opening collection")
         # Open collection.anki2
         try:
-            self.collection = Collection(collection_path)
+            if self.snapshot:
+                self.collection = ReadOnlyCollection(
+                    collection_path, snapshotPath=Snapshot(collection_path).acquire())
+            elif self.readOnly:
+                self.collection = ReadOnlyCollection(collection_path)
+            else:
+                # anki is heavy to import, it is loaded only when a collection is opened
+                from anki.collection import Collection
+                self.collection = Collection(collection_path)
         except:
             # Error while opening collection.anki2
             return -3
@@ -472,35 +791,4 @@ class AnkiCore:
             str: Path of the Anki folder
             str: None if the OS is not supported
         """
-        if os.name == 'nt':
-            return self._getWindowsAnkiPath()
-        elif os.name == 'posix':
-            return self._getLinuxAnkiPath()
-        elif os.name == 'darwin':
-            return self._getMacOSAnkiPath()
-        else:
-            return None
-
-    def _getMacOSAnkiPath(self) -> str:
-        """Returns the path of the Anki folder on MacOS.
-
-        Returns:
-            str: Path of the Anki folder on MacOS
-        """
-        return os.path.join(os.getenv('HOME'), 'Documents/Anki')
-
-    def _getWindowsAnkiPath(self) -> str:
-        """Returns the path of the Anki folder on Windows.
-
-        Returns:
-            str: Path of the Anki folder on Windows
-        """
-        return os.path.join(os.getenv('APPDATA'), 'Anki2')
-
-    def _getLinuxAnkiPath(self) -> str:
-        """Returns the path of the Anki folder on Linux.
-
-        Returns:
-            str: Path of the Anki folder on Linux
-        """
-        return os.path.join(os.getenv('HOME'), '.local/share/Anki2')
+        return ankiBaseDir()
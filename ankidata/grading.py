@@ -0,0 +1,121 @@
+import itertools
+import operator
+
+# Answer keys and answer sheets are bitmasks: bit i is set when answer i (A=0, B=1, ...)
+# is correct or selected. A question is answered correctly when both masks are equal.
+
+
+def parseKey(correct) -> int:
+    """Converts the correct answers field to a bitmask.
+
+    Args:
+        correct (str): Correct answers, for example "ABD", case and spaces are ignored
+
+    Returns:
+        int: Bitmask of correct answers, letters outside A-Z are ignored
+    """
+    mask = 0
+    for letter in correct.upper():
+        index = ord(letter)-65
+        if 0 <= index < 26:
+            mask |= 1 << index
+    return mask
+
+
+def indexesToMask(indexes) -> int:
+    """Converts indexes of answers to a bitmask.
+
+    Args:
+        indexes (list): Indexes of answers
+
+    Returns:
+        int: Bitmask
+    """
+    mask = 0
+    for index in indexes:
+        mask |= 1 << index
+    return mask
+
+
+def maskToIndexes(mask) -> list:
+    """Converts a bitmask to indexes of answers.
+
+    Args:
+        mask (int): Bitmask
+
+    Returns:
+        list: Indexes of answers, in increasing order
+    """
+    indexes = []
+    index = 0
+    while mask:
+        if mask & 1:
+            indexes.append(index)
+        mask >>= 1
+        index += 1
+    return indexes
+
+
+def isSet(mask, index) -> bool:
+    """Returns True if the answer is in the bitmask.
+
+    Args:
+        mask (int): Bitmask
+        index (int): Index of the answer
+
+    Returns:
+        bool: True if the bit of the answer is set
+    """
+    return (mask >> index) & 1 == 1
+
+
+def gradeSheet(keys, sheet) -> list:
+    """Grades one answer sheet.
+
+    Args:
+        keys (list): Bitmasks of correct answers of every question
+        sheet (list): Bitmasks of selected answers of every question, None or a missing entry for an unanswered question
+
+    Returns:
+        list: True for every question answered exactly right, an unanswered question is wrong
+
+    Raises:
+        ValueError: if the sheet has more entries than there are questions
+    """
+    return list(itertools.starmap(operator.eq, _pairs(keys, sheet)))
+
+
+def gradeSessions(keys, sheets) -> list:
+    """Grades many answer sheets of the same deck.
+
+    Args:
+        keys (list): Bitmasks of correct answers of every question
+        sheets (list): Answer sheets, lists of bitmasks of selected answers, None or a missing entry for an unanswered question
+
+    Returns:
+        list: Score of every sheet
+
+    Raises:
+        ValueError: if a sheet has more entries than there are questions
+    """
+    keys = list(keys)
+    return [sum(itertools.starmap(operator.eq, _pairs(keys, sheet))) for sheet in sheets]
+
+
+def _pairs(keys, sheet):
+    """Pairs every key with the entry of the sheet, missing entries are None.
+
+    Args:
+        keys (list): Bitmasks of correct answers of every question
+        sheet (list): Bitmasks of selected answers
+
+    Returns:
+        iterator: [key, entry] pairs, one for every question
+
+    Raises:
+        ValueError: if the sheet has more entries than there are questions
+    """
+    sheet = list(sheet)
+    if len(sheet) > len(keys):
+        raise ValueError(f"Answer sheet has {len(sheet)} entries for {len(keys)} questions")
+    return itertools.zip_longest(keys, sheet)
@@ -0,0 +1,196 @@
+import collections
+import html
+import io
+import mmap
+import os
+import threading
+import urllib.parse
+
+
+class MediaIndex:
+    def __init__(self, directory):
+        """Initializes the MediaIndex object.
+
+        The index maps the exact file name to its path in the media folder. It is
+        refreshed when the modification time of the folder changes.
+
+        Args:
+            directory (str): Path of the media folder
+        """
+        self.directory = directory
+        self.files = {}
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Scans the media folder again if it changed since the last scan.
+
+        Returns:
+            bool: True if the index was updated
+        """
+        with self.lock:
+            try:
+                mtime = os.stat(self.directory).st_mtime_ns
+            except OSError:
+                self.files = {}
+                self.mtime = None
+                return False
+            if mtime == self.mtime:
+                return False
+            # the folder is scanned again, removed files must leave the index
+            with os.scandir(self.directory) as entries:
+                self.files = {entry.name: entry.path for entry in entries if entry.is_file()}
+            self.mtime = mtime
+            return True
+
+    def path(self, name) -> str:
+        """Returns the path of the media file.
+
+        Args:
+            name (str): File name as used in the note
+
+        Returns:
+            str: Path of the file
+            str: None if the file is not in the media folder
+        """
+        for candidate in self._candidates(name):
+            if candidate in self.files:
+                return self.files[candidate]
+        if self.refresh():
+            for candidate in self._candidates(name):
+                if candidate in self.files:
+                    return self.files[candidate]
+        return None
+
+    def __len__(self):
+        return len(self.files)
+
+    def _candidates(self, name) -> list:
+        """Returns the possible file names of the name used in the note.
+
+        Args:
+            name (str): File name as used in the note
+
+        Returns:
+            list: File names
+        """
+        unescaped = html.unescape(name)
+        return [name, unescaped, urllib.parse.unquote(unescaped)]
+
+
+class ImageCache:
+    def __init__(self, maxBytes):
+        """Initializes the ImageCache object.
+
+        The cache keeps the content of recently used media files and drops the least
+        recently used ones when the total size is bigger than maxBytes.
+
+        Args:
+            maxBytes (int): Maximum size of cached files in bytes
+        """
+        self.maxBytes = maxBytes
+        self.files = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, path) -> bytes:
+        """Returns the content of the file, reading it if it is not cached.
+
+        Args:
+            path (str): Path of the file
+
+        Returns:
+            bytes: Content of the file
+        """
+        with self.lock:
+            if path in self.files:
+                self.files.move_to_end(path)
+                return self.files[path]
+        with open(path, 'rb') as f:
+            data = f.read()
+        with self.lock:
+            if path not in self.files:
+                self.files[path] = data
+                self.size += len(data)
+            self._evict(keep=path)
+        return data
+
+    def clear(self):
+        """Removes all files from the cache.
+        """
+        with self.lock:
+            self.files.clear()
+            self.size = 0
+
+    def _evict(self, keep):
+        """Removes the least recently used files until the cache fits in maxBytes.
+
+        Args:
+            keep (str): Path of the file that is not removed
+        """
+        while self.size > self.maxBytes and len(self.files) > 1:
+            path, data = next(iter(self.files.items()))
+            if path == keep:
+                self.files.move_to_end(path)
+                continue
+            del self.files[path]
+            self.size -= len(data)
+        if self.size > self.maxBytes and keep in self.files:
+            # a single file bigger than the cache is not kept
+            self.size -= len(self.files.pop(keep))
+
+
+class ImageHandle:
+    def __init__(self, name, path, cache, mmapThreshold):
+        """Initializes the ImageHandle object.
+
+        The handle gives the binary content of a media file without any encoding.
+        Files smaller than mmapThreshold are read through the image cache, bigger
+        files are memory-mapped.
+
+        Args:
+            name (str): File name as used in the note
+            path (str): Path of the file
+            cache (ImageCache): Cache of loaded images
+            mmapThreshold (int): Size in bytes from which the file is memory-mapped
+        """
+        self.name = name
+        self.path = path
+        self.cache = cache
+        self.mmapThreshold = mmapThreshold
+
+    def size(self) -> int:
+        """Returns the size of the file.
+
+        Returns:
+            int: Size in bytes
+        """
+        return os.path.getsize(self.path)
+
+    def bytes(self) -> bytes:
+        """Returns the content of the file.
+
+        Returns:
+            bytes: Content of the file
+        """
+        return self.cache.get(self.path)
+
+    def memoryview(self) -> memoryview:
+        """Returns a view of the content of the file without copying it.
+
+        Returns:
+            memoryview: Content of the file
+        """
+        return memoryview(self.bytes())
+
+    def open(self):
+        """Opens the file as a binary stream, use it as a context manager.
+
+        Returns:
+            io.BytesIO: Stream over the cached content
+            mmap.mmap: Memory-mapped file if the file is big
+        """
+        if self.size() >= self.mmapThreshold:
+            with open(self.path, 'rb') as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return io.BytesIO(self.bytes())
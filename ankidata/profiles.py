@@ -0,0 +1,189 @@
+import io
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+
+# Name of the collection file in a profile folder
+COLLECTION_FILE = "collection.anki2"
+# Folders of the Anki folder that are not profiles
+_NOT_PROFILES = {"addons21", "logs", "crash-reports"}
+
+
+def userCacheDir() -> str:
+    """Returns the folder of files cached by AnkiTest.
+
+    Returns:
+        str: Path of the folder
+    """
+    if os.name == 'nt' and os.getenv('LOCALAPPDATA') != None:
+        base = os.getenv('LOCALAPPDATA')
+    elif os.getenv('XDG_CACHE_HOME') != None:
+        base = os.getenv('XDG_CACHE_HOME')
+    elif os.getenv('HOME') != None:
+        base = os.path.join(os.getenv('HOME'), '.cache')
+    else:
+        base = tempfile.gettempdir()
+    return os.path.join(base, 'AnkiTest')
+
+
+def ankiBaseDir() -> str:
+    """Returns the Anki folder holding the profiles.
+
+    Returns:
+        str: Path of the Anki folder
+        None: if the OS is not supported
+    """
+    if os.getenv('ANKI_BASE') != None:
+        return os.getenv('ANKI_BASE')
+    if os.name == 'nt':
+        if os.getenv('APPDATA') == None:
+            return None
+        return os.path.join(os.getenv('APPDATA'), 'Anki2')
+    if os.getenv('HOME') == None:
+        return None
+    if sys.platform == 'darwin':
+        return os.path.join(os.getenv('HOME'), 'Library/Application Support/Anki2')
+    if os.getenv('XDG_DATA_HOME') != None:
+        return os.path.join(os.getenv('XDG_DATA_HOME'), 'Anki2')
+    return os.path.join(os.getenv('HOME'), '.local/share/Anki2')
+
+
+class _PlainUnpickler(pickle.Unpickler):
+    # prefs21.db stores pickled dicts, no class may be created while reading them
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed")
+
+
+class ProfileLocator:
+    def __init__(self, base=None, cachePath=None):
+        """Initializes the ProfileLocator object.
+
+        Profiles are read from prefs21.db, or from the folders at the top of the Anki
+        folder when it cannot be read. Media folders are never listed. The resolved
+        collection is remembered in a small file, so later starts only check that it
+        still exists.
+
+        Args:
+            base (str, optional): Anki folder. Defaults to ankiBaseDir().
+            cachePath (str, optional): File of the remembered collection. Defaults to profile.json in userCacheDir().
+        """
+        self.base = base if base != None else ankiBaseDir()
+        self.cachePath = cachePath if cachePath != None else os.path.join(
+            userCacheDir(), 'profile.json')
+
+    def profiles(self) -> list:
+        """Returns the profiles that have a collection.
+
+        Returns:
+            list: Profiles names, sorted
+        """
+        if self.base == None or not os.path.isdir(self.base):
+            return []
+        names = self._readPrefs()
+        if names == None:
+            try:
+                names = [entry.name for entry in os.scandir(self.base)
+                         if entry.is_dir() and entry.name not in _NOT_PROFILES]
+            except OSError:
+                return []
+        return sorted(name for name in names
+                      if os.path.isfile(os.path.join(self.base, name, COLLECTION_FILE)))
+
+    def lastProfile(self) -> str:
+        """Returns the profile opened last in Anki.
+
+        Returns:
+            str: Profile name
+            None: if it is not known
+        """
+        data = self._readPrefs(globalData=True)
+        if not isinstance(data, dict):
+            return None
+        return data.get('last_loaded_profile_name')
+
+    def collectionPath(self, profile=None) -> str:
+        """Returns the path of the collection of the profile and remembers it.
+
+        Args:
+            profile (str, optional): Profile name. Defaults to the remembered profile, then the
+                profile opened last in Anki, then the first profile.
+
+        Returns:
+            str: Path of collection.anki2
+            None: if no collection is found
+        """
+        if self.base == None:
+            return None
+        remembered = self._readCache()
+        if profile == None and remembered.get('base') == self.base and remembered.get('path') != None \
+                and os.path.isfile(remembered['path']):
+            return remembered['path']
+        profiles = self.profiles()
+        if profile == None:
+            for candidate in (remembered.get('profile'), self.lastProfile()):
+                if candidate in profiles:
+                    profile = candidate
+                    break
+            else:
+                if len(profiles) == 0:
+                    return None
+                profile = profiles[0]
+        elif profile not in profiles:
+            return None
+        path = os.path.join(self.base, profile, COLLECTION_FILE)
+        self._writeCache({'base': self.base, 'profile': profile, 'path': path})
+        return path
+
+    def _readPrefs(self, globalData=False):
+        """Reads prefs21.db read-only.
+
+        Args:
+            globalData (bool, optional): Return the global settings instead of the profiles names. Defaults to False.
+
+        Returns:
+            list: Profiles names, or the global settings as dict
+            None: if the file cannot be read
+        """
+        path = os.path.join(self.base, 'prefs21.db')
+        if not os.path.isfile(path):
+            return None
+        try:
+            db = sqlite3.connect(
+                'file:'+path.replace('?', '%3f').replace('#', '%23')+'?mode=ro', uri=True, timeout=1)
+            try:
+                rows = db.execute("select name, data from profiles").fetchall()
+            finally:
+                db.close()
+        except sqlite3.Error:
+            return None
+        if not globalData:
+            return [name for name, _ in rows if name != '_global']
+        for name, data in rows:
+            if name == '_global':
+                try:
+                    return _PlainUnpickler(io.BytesIO(data)).load()
+                except Exception:
+                    return None
+        return None
+
+    def _readCache(self) -> dict:
+        try:
+            with open(self.cachePath, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cached if isinstance(cached, dict) else {}
+
+    def _writeCache(self, cached):
+        try:
+            os.makedirs(os.path.dirname(self.cachePath), exist_ok=True)
+            temp = f"{self.cachePath}.{os.getpid()}.tmp"
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(cached, f)
+            os.replace(temp, self.cachePath)
+        except OSError:
+            # remembering the collection is optional
+            pass
@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+
+# Separator of deck name components in the decks table
+_DECK_SEPARATOR = "\x1f"
+
+
+class _Database:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def all(self, sql, *args) -> list:
+        return [list(row) for row in self.connection.execute(sql, args)]
+
+    def list(self, sql, *args) -> list:
+        return [row[0] for row in self.connection.execute(sql, args)]
+
+    def scalar(self, sql, *args):
+        row = self.connection.execute(sql, args).fetchone()
+        if row == None:
+            return None
+        return row[0]
+
+
+class _Decks:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def all(self) -> list:
+        """Returns all decks as dictionaries with id and name.
+
+        Returns:
+            list: Decks
+        """
+        db = self.collection.db
+        if self.collection.schema >= 15:
+            return [{'id': did, 'name': name.replace(_DECK_SEPARATOR, "::")}
+                    for did, name in db.all("select id, name from decks")]
+        decks = json.loads(db.scalar("select decks from col"))
+        return [{'id': deck['id'], 'name': deck['name']} for deck in decks.values()]
+
+
+class _Models:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def id_for_name(self, name) -> int:
+        """Returns the id of the notetype.
+
+        Args:
+            name (str): Notetype name
+
+        Returns:
+            int: Notetype id
+            None: if not found
+        """
+        db = self.collection.db
+        if self.collection.schema >= 15:
+            models = db.all("select id, name from notetypes")
+        else:
+            models = [[model['id'], model['name']] for model in json.loads(
+                db.scalar("select models from col")).values()]
+        for mid, modelName in models:
+            if modelName.casefold() == name.casefold():
+                return int(mid)
+        return None
+
+
+class _Media:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def dir(self) -> str:
+        return self.directory
+
+
+class ReadOnlyCollection:
+    def __init__(self, path, mediaDir=None, snapshotPath=None):
+        """Opens collection.anki2 read-only with SQLite, without the Anki backend.
+
+        Any number of processes can hold such a handle at the same time. Only the
+        parts of the collection used by AnkiCore and Deck are available.
+
+        Args:
+            path (str): Path of collection.anki2
+            mediaDir (str, optional): Path of the media folder. Defaults to collection.media next to path.
+            snapshotPath (str, optional): Snapshot of the collection read instead of path, see Snapshot.
+                It never changes, so it is opened without locks. Defaults to None.
+        """
+        self.path = path
+        self.snapshotPath = snapshotPath
+        if snapshotPath != None:
+            uri = f"file:{_quote(snapshotPath)}?mode=ro&immutable=1"
+        else:
+            uri = f"file:{_quote(path)}?mode=ro"
+        connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        connection.create_collation("unicase", _unicase)
+        self.db = _Database(connection)
+        self.schema = self.db.scalar("select ver from col")
+        self.decks = _Decks(self)
+        self.models = _Models(self)
+        if mediaDir == None:
+            mediaDir = os.path.splitext(path)[0]+".media"
+        self.media = _Media(mediaDir)
+
+    def close(self):
+        """Closes the collection.
+        """
+        self.db.connection.close()
+
+
+def _quote(path) -> str:
+    """Quotes the path for a SQLite URI.
+
+    Args:
+        path (str): Path
+
+    Returns:
+        str: Quoted path
+    """
+    return path.replace("%", "%25").replace("?", "%3f").replace("#", "%23")
+
+
+def _unicase(a, b) -> int:
+    a = a.casefold()
+    b = b.casefold()
+    return (a > b)-(a < b)
@@ -0,0 +1,216 @@
+from ankidata import grading
+from array import array
+import random
+
+
+class Session:
+    def __init__(self, deck, seed=None, shuffleQuestions=False):
+        """Initializes the Session object.
+
+        A session is one run through a deck. Sessions only read the questions, and the
+        deck loads its remaining questions under a lock, so many sessions can share one
+        deck, also while it is still loading. The answers of every question are shuffled
+        once, by a permutation derived from the seed and the index of the question, so the
+        order is stable across renders and the same seed replays the same session.
+
+        Args:
+            deck (Deck): Deck, loaded at least partially
+            seed (int, optional): Seed of the permutations. Defaults to a random seed.
+            shuffleQuestions (bool, optional): Ask the questions in random order, the whole deck
+                is loaded first. Defaults to False, the order of the deck.
+        """
+        self.deck = deck
+        # the seed is kept so the session can be replayed
+        self.seed = seed if seed != None else random.randrange(2**32)
+        self.position = 0
+        self.score = 0
+        self.wrongQuestions = array('I')
+        # answer i of question q shown at position j is answer permutations[offset(q)+j] of the deck
+        self.permutations = array('B')
+        self.permuted = bytearray()
+        self.order = None
+        self.current = None
+        self.currentAnswers = None
+        if shuffleQuestions and deck.isLoaded():
+            while deck.loadMore(batches=16):
+                pass
+            self.order = array('I', range(deck.getQuestionsNum()))
+            random.Random(self.seed).shuffle(self.order)
+
+    def getDeckName(self) -> str:
+        """Returns the deck name.
+
+        Returns:
+            str: Deck name
+        """
+        return self.deck.getDeckName()
+
+    def getQuestionsNum(self) -> int:
+        """Returns the number of loaded questions.
+
+        Returns:
+            int: Number of questions
+        """
+        return self.deck.getQuestionsNum()
+
+    def getQuestionIndex(self) -> int:
+        """Returns the position of the current question in the session.
+
+        Returns:
+            int: Position
+        """
+        return self.position
+
+    def questionIndex(self, position=None) -> int:
+        """Returns the index in the deck of the question at the position.
+
+        Args:
+            position (int, optional): Position in the session. Defaults to the current position.
+
+        Returns:
+            int: Index of the question in the deck
+        """
+        if position == None:
+            position = self.position
+        if self.order == None:
+            return position
+        return self.order[position]
+
+    def getQuestion(self) -> str:
+        """Returns the current question.
+
+        Returns:
+            str: Question
+            str: "" if no more questions or deck not loaded
+        """
+        if not self._valid():
+            return ""
+        return self.deck.questions[self.questionIndex()]
+
+    def getAnswers(self) -> list:
+        """Returns the answers of the current question in the order of the session.
+
+        The list is built once per question, rendering the question again does not change it.
+
+        Returns:
+            list: Answers
+            list: [] if no more questions or deck not loaded
+        """
+        if not self._valid():
+            return []
+        if self.current != self.position:
+            index = self.questionIndex()
+            answers = self.deck.answers[index]
+            self.currentAnswers = [answers[i] for i in self.answerOrder(index)]
+            self.current = self.position
+        return self.currentAnswers
+
+    def getImages(self, position=None) -> list:
+        """Returns the images of the question.
+
+        Args:
+            position (int, optional): Position in the session. Defaults to the current position.
+
+        Returns:
+            list: Images as ImageHandle
+        """
+        if position == None:
+            position = self.position
+        if position >= self.getQuestionsNum():
+            return []
+        return self.deck.getImages(self.questionIndex(position))
+
+    def answerOrder(self, index) -> array:
+        """Returns the permutation of the answers of the question.
+
+        Args:
+            index (int): Index of the question in the deck
+
+        Returns:
+            array: Index in the deck of the answer shown at every position
+        """
+        store = self.deck.store
+        start = store.answerOffsets[index]
+        end = store.answerOffsets[index+1]
+        if len(self.permutations) < len(store.answerIds):
+            self.permutations.extend(bytes(len(store.answerIds)-len(self.permutations)))
+            self.permuted.extend(bytes(len(store)-len(self.permuted)))
+        if not self.permuted[index]:
+            order = list(range(end-start))
+            random.Random((self.seed << 32) | index).shuffle(order)
+            self.permutations[start:end] = array('B', order)
+            self.permuted[index] = 1
+        return self.permutations[start:end]
+
+    def updateScore(self, answers) -> int:
+        """Grades the answers of the current question.
+
+        The point is given only when the selected answers are exactly the correct ones.
+
+        Args:
+            answers (list): Positions of selected answers, as shown by getAnswers
+
+        Returns:
+            int: 0 if success, -1 if deck not loaded, -2 if no more questions
+        """
+        if self.deck.isLoaded() == False:
+            return -1
+        if self.position >= self.getQuestionsNum():
+            return -2
+        index = self.questionIndex()
+        order = self.answerOrder(index)
+        if grading.indexesToMask([order[i] for i in answers]) == self.deck.correct[index]:
+            self.score += 1
+        else:
+            self.wrongQuestions.append(index)
+        return 0
+
+    def nextQuestion(self) -> int:
+        """Moves to the next question, loading more questions of the deck when needed.
+
+        Returns:
+            int: 0 if success, -1 if no more questions, -2 if deck not loaded
+        """
+        if self.deck.isLoaded() == False:
+            return -2
+        if self.position >= self.getQuestionsNum()-1 and self.order == None:
+            self.deck.loadMore()
+        if self.position >= self.getQuestionsNum()-1:
+            return -1
+        self.position += 1
+        return 0
+
+    def getScore(self) -> int:
+        """Returns the score.
+
+        Returns:
+            int: Score
+        """
+        return self.score
+
+    def getMaxScore(self) -> int:
+        """Returns the maximum score, the number of loaded questions.
+
+        Returns:
+            int: Maximum score
+        """
+        return self.getQuestionsNum()
+
+    def getScorePercentage(self) -> float:
+        """Returns the score percentage.
+
+        Returns:
+            float: Score percentage
+        """
+        return round(self.score/self.getQuestionsNum()*100, 2)
+
+    def getWrongQuestions(self) -> list:
+        """Returns the wrongly answered questions.
+
+        Returns:
+            list: Questions
+        """
+        return [self.deck.questions[index] for index in self.wrongQuestions]
+
+    def _valid(self) -> bool:
+        return self.deck.isLoaded() and self.position < self.getQuestionsNum()
@@ -0,0 +1,230 @@
+from ankidata.profiles import userCacheDir
+from ankidata.readonly import _quote, _unicase
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+# A snapshot younger than this is reused even if the collection changed, in seconds
+SNAPSHOT_MAX_AGE = 30
+# A lock older than this was left by a crashed process, in seconds
+LOCK_TIMEOUT = 120
+# Time waited for a busy collection before its files are copied, in seconds
+BUSY_TIMEOUT = 1
+# Number of copies tried when the collection changes while it is copied
+COPY_ATTEMPTS = 3
+
+
+class Snapshot:
+    def __init__(self, path, maxAge=SNAPSHOT_MAX_AGE, directory=None):
+        """Initializes the Snapshot object.
+
+        A snapshot is a consistent copy of collection.anki2 in the AnkiTest cache folder.
+        It is made with the SQLite backup API, or by copying the files when Anki holds
+        its exclusive lock. Snapshots never change after they are made, so any number of
+        processes can read them at the same time without locks. A snapshot is reused
+        while the collection did not change or while it is younger than maxAge.
+
+        Args:
+            path (str): Path of collection.anki2
+            maxAge (int, optional): Age in seconds until a changed collection is copied again. Defaults to SNAPSHOT_MAX_AGE.
+            directory (str, optional): Folder of the snapshots of this collection. Defaults to a folder in userCacheDir().
+        """
+        self.source = os.path.abspath(path)
+        self.maxAge = maxAge
+        if directory == None:
+            key = hashlib.sha1(os.path.normcase(self.source).encode()).hexdigest()[:16]
+            directory = os.path.join(userCacheDir(), 'snapshots', key)
+        self.directory = directory
+        self.metaPath = os.path.join(directory, 'snapshot.json')
+        self.lockPath = os.path.join(directory, 'snapshot.lock')
+
+    def acquire(self) -> str:
+        """Returns the path of a fresh snapshot, making it if needed.
+
+        Returns:
+            str: Path of the snapshot
+
+        Raises:
+            OSError: if the collection cannot be copied
+            sqlite3.Error: if no consistent copy can be made
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._fresh()
+        if path != None:
+            return path
+        # only one process makes the snapshot, the others wait for it
+        while not self._lock():
+            time.sleep(0.1)
+            path = self._fresh()
+            if path != None:
+                return path
+        try:
+            path = self._fresh()
+            if path == None:
+                path = self._make()
+        finally:
+            self._unlock()
+        self._clean(path)
+        return path
+
+    def signature(self) -> list:
+        """Returns the size and modification time of the collection and its WAL file.
+
+        Returns:
+            list: [size, mtime] of collection.anki2 and of collection.anki2-wal, or None if it does not exist
+        """
+        out = []
+        for path in (self.source, self.source+"-wal"):
+            try:
+                stat = os.stat(path)
+                out.append([stat.st_size, stat.st_mtime_ns])
+            except FileNotFoundError:
+                out.append(None)
+        return out
+
+    def _fresh(self) -> str:
+        """Returns the path of the current snapshot if it can be reused.
+
+        Returns:
+            str: Path of the snapshot
+            None: if there is no fresh snapshot
+        """
+        try:
+            with open(self.metaPath, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = os.path.join(self.directory, meta.get('file', ''))
+        if not os.path.isfile(path):
+            return None
+        if meta.get('signature') == self.signature() or time.time()-meta.get('created', 0) < self.maxAge:
+            return path
+        return None
+
+    def _make(self) -> str:
+        """Makes a new snapshot.
+
+        Returns:
+            str: Path of the snapshot
+        """
+        if not os.path.isfile(self.source):
+            raise FileNotFoundError(self.source)
+        # every snapshot has its own file, readers of the previous one are not disturbed
+        name = f"collection-{time.time_ns()}-{os.getpid()}.anki2"
+        path = os.path.join(self.directory, name)
+        temp = path+".tmp"
+        signature = self.signature()
+        try:
+            try:
+                self._backup(temp)
+            except sqlite3.OperationalError:
+                # Anki holds an exclusive lock, the files are copied instead
+                for attempt in range(COPY_ATTEMPTS):
+                    signature = self.signature()
+                    try:
+                        self._copy(temp)
+                        if signature == self.signature():
+                            break
+                    except sqlite3.DatabaseError:
+                        if attempt == COPY_ATTEMPTS-1:
+                            raise
+            os.replace(temp, path)
+        finally:
+            for leftover in (temp, temp+"-wal", temp+"-shm", temp+"-journal"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        meta = {'source': self.source, 'file': name,
+                'signature': signature, 'created': time.time()}
+        with open(self.metaPath+".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(self.metaPath+".tmp", self.metaPath)
+        return path
+
+    def _backup(self, temp):
+        """Copies the collection with the SQLite backup API, which sees a consistent state.
+
+        Args:
+            temp (str): Path of the copy
+        """
+        source = sqlite3.connect(
+            f"file:{_quote(self.source)}?mode=ro", uri=True, timeout=BUSY_TIMEOUT)
+        deadline = time.monotonic()+BUSY_TIMEOUT
+
+        def progress(status, remaining, total):
+            # backup retries a locked collection forever
+            if time.monotonic() > deadline:
+                raise sqlite3.OperationalError("database is locked")
+        try:
+            source.execute("select count(*) from sqlite_master").fetchone()
+            target = sqlite3.connect(temp)
+            try:
+                source.backup(target, pages=1024, progress=progress)
+                target.execute("pragma journal_mode = delete")
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+    def _copy(self, temp):
+        """Copies the files of the collection and checks the copy.
+
+        The WAL file is copied with the collection, SQLite applies it when the copy is opened.
+
+        Args:
+            temp (str): Path of the copy
+
+        Raises:
+            sqlite3.DatabaseError: if the copy is not consistent
+        """
+        shutil.copyfile(self.source, temp)
+        if os.path.exists(self.source+"-wal"):
+            shutil.copyfile(self.source+"-wal", temp+"-wal")
+        db = sqlite3.connect(temp)
+        db.create_collation("unicase", _unicase)
+        try:
+            # the WAL is written into the copy, readers of the snapshot need a single file
+            db.execute("pragma journal_mode = delete")
+            if db.execute("pragma quick_check").fetchone()[0] != "ok":
+                raise sqlite3.DatabaseError("Inconsistent copy of the collection")
+        finally:
+            db.close()
+
+    def _lock(self) -> bool:
+        """Takes the lock of the snapshot folder.
+
+        Returns:
+            bool: True if the lock was taken
+        """
+        try:
+            os.close(os.open(self.lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time()-os.path.getmtime(self.lockPath) > LOCK_TIMEOUT:
+                    os.remove(self.lockPath)
+            except OSError:
+                pass
+            return False
+
+    def _unlock(self):
+        try:
+            os.remove(self.lockPath)
+        except OSError:
+            pass
+
+    def _clean(self, current):
+        """Removes the old snapshots, the ones still open are removed later.
+
+        Args:
+            current (str): Path of the current snapshot
+        """
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("collection-") and entry.path != current \
+                    and time.time()-entry.stat().st_mtime > LOCK_TIMEOUT:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
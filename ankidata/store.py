@@ -0,0 +1,153 @@
+from array import array
+
+# Strings up to this length are interned, so repeated answers are stored once
+INTERN_LIMIT = 16
+# Size of a block of the string table in characters
+CHUNK_SIZE = 1 << 16
+
+
+class StringTable:
+    def __init__(self):
+        """Initializes the StringTable object.
+
+        Strings are concatenated into blocks of about CHUNK_SIZE characters and are
+        addressed by id, a string is created only when it is read.
+        """
+        self.chunks = []
+        self.pending = []
+        self.pendingSize = 0
+        self.pendingText = None
+        self.chunk = array('I')
+        self.start = array('I')
+        self.length = array('I')
+        self.interned = {}
+
+    def add(self, string) -> int:
+        """Adds the string and returns its id.
+
+        Args:
+            string (str): String
+
+        Returns:
+            int: Id of the string
+        """
+        short = len(string) <= INTERN_LIMIT
+        if short and string in self.interned:
+            return self.interned[string]
+        sid = len(self.start)
+        self.chunk.append(len(self.chunks))
+        self.start.append(self.pendingSize)
+        self.length.append(len(string))
+        self.pending.append(string)
+        self.pendingSize += len(string)
+        self.pendingText = None
+        if short:
+            self.interned[string] = sid
+        if self.pendingSize >= CHUNK_SIZE:
+            self.chunks.append("".join(self.pending))
+            self.pending = []
+            self.pendingSize = 0
+        return sid
+
+    def get(self, sid) -> str:
+        """Returns the string.
+
+        Args:
+            sid (int): Id of the string
+
+        Returns:
+            str: String
+        """
+        chunk = self.chunk[sid]
+        if chunk < len(self.chunks):
+            text = self.chunks[chunk]
+        else:
+            if self.pendingText == None:
+                self.pendingText = "".join(self.pending)
+            text = self.pendingText
+        start = self.start[sid]
+        return text[start:start+self.length[sid]]
+
+    def __len__(self):
+        return len(self.start)
+
+
+class _Column:
+    def __init__(self, store, read):
+        self.store = store
+        self.read = read
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.read(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("question index out of range")
+        return self.read(index)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.read(index)
+
+
+class QuestionStore:
+    def __init__(self):
+        """Initializes the QuestionStore object.
+
+        Questions are kept as flat arrays of ids into one string table instead of lists
+        of lists of strings. The columns questions, answers, correct and images read like
+        lists indexed by question.
+        """
+        self.strings = StringTable()
+        self.questionIds = array('I')
+        self.answerOffsets = array('I', [0])
+        self.answerIds = array('I')
+        self.correctMasks = array('I')
+        self.imageOffsets = array('I', [0])
+        self.imageIds = array('I')
+        self.questions = _Column(self, self.getQuestion)
+        self.answers = _Column(self, self.getAnswers)
+        self.correct = _Column(self, self.getCorrect)
+        self.images = _Column(self, self.getImages)
+
+    def append(self, question, answers, correct, images) -> int:
+        """Adds a question and returns its index.
+
+        Args:
+            question (str): Question
+            answers (list): Answers
+            correct (int): Bitmask of correct answers
+            images (list): Images names
+
+        Returns:
+            int: Index of the question
+        """
+        strings = self.strings
+        self.questionIds.append(strings.add(question))
+        self.answerIds.extend([strings.add(answer) for answer in answers])
+        self.answerOffsets.append(len(self.answerIds))
+        self.correctMasks.append(correct)
+        self.imageIds.extend([strings.add(image) for image in images])
+        self.imageOffsets.append(len(self.imageIds))
+        return len(self.questionIds)-1
+
+    def getQuestion(self, index) -> str:
+        return self.strings.get(self.questionIds[index])
+
+    def getAnswers(self, index) -> list:
+        get = self.strings.get
+        return [get(sid) for sid in self.answerIds[self.answerOffsets[index]:self.answerOffsets[index+1]]]
+
+    def getCorrect(self, index) -> int:
+        return self.correctMasks[index]
+
+    def getImages(self, index) -> list:
+        get = self.strings.get
+        return [get(sid) for sid in self.imageIds[self.imageOffsets[index]:self.imageOffsets[index+1]]]
+
+    def __len__(self):
+        return len(self.questionIds)
@@ -0,0 +1,134 @@
+import html
+import html.entities
+import re
+
+# Separator of fields in notes, Anki never stores it inside a field
+FIELD_SEPARATOR = "\x1f"
+# Marks the images extracted from the text, removed from the input
+_IMAGE_MARK = "\x1d"
+# Maximum number of different tokens kept in the replacements table
+_MAX_REPLACEMENTS = 20000
+
+# Splits the text into plain text and tokens in one pass, tokens are at odd indexes.
+# Tokens never span FIELD_SEPARATOR, so batches of notes split into the same fields.
+_SPLIT = re.compile(
+    r"(<[^<>\x1f]*>|&#?[A-Za-z0-9]{1,32};|\[sound:[^\]\x1f]*\]|" + _IMAGE_MARK + ")")
+_BR = re.compile(r"<br\s*/?\s*>", re.IGNORECASE)
+_IMG = re.compile(
+    r"<img\b[^>]*?\bsrc\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))", re.IGNORECASE)
+_TAG = re.compile(r"</?[A-Za-z!]")
+_ENTITY = re.compile(r"&(#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6}|[A-Za-z][A-Za-z0-9]*);")
+
+# Anki uses &nbsp; as a normal space
+_ENTITIES = {name[:-1]: value for name,
+             value in html.entities.html5.items() if name.endswith(";")}
+_ENTITIES["nbsp"] = " "
+
+
+def _replaceToken(token) -> str:
+    """Returns the replacement of one token found by _SPLIT.
+
+    Args:
+        token (str): Tag, entity, sound or image mark
+
+    Returns:
+        str: Replacement
+    """
+    if token[0] == "&":
+        match = _ENTITY.fullmatch(token)
+        if match == None:
+            return token
+        if match.group(1)[0] == "#":
+            return html.unescape(token)
+        return _ENTITIES.get(match.group(1), token)
+    if token[0] == "<":
+        if _BR.fullmatch(token):
+            return "\n"
+        match = _IMG.match(token)
+        if match != None:
+            src = match.group(1) or match.group(2) or match.group(3)
+            if src:
+                return _IMAGE_MARK+src+_IMAGE_MARK
+            return ""
+        if _TAG.match(token) == None:
+            return token
+    return ""
+
+
+class _Replacements(dict):
+    def __missing__(self, token):
+        if len(self) >= _MAX_REPLACEMENTS:
+            self.clear()
+        replacement = _replaceToken(token)
+        self[token] = replacement
+        return replacement
+
+
+_REPLACEMENTS = _Replacements()
+
+
+def _replaceAll(text) -> str:
+    """Replaces all tokens of the text in one pass.
+
+    Args:
+        text (str): HTML
+
+    Returns:
+        str: Text with image marks
+    """
+    parts = _SPLIT.split(text)
+    if len(parts) == 1:
+        return text
+    replacements = _REPLACEMENTS
+    parts[1::2] = [replacements[token] for token in parts[1::2]]
+    return "".join(parts)
+
+
+def _splitImages(text) -> list:
+    """Separates the image marks from the text.
+
+    Args:
+        text (str): Text with image marks
+
+    Returns:
+        list: [text, images]
+    """
+    if _IMAGE_MARK not in text:
+        return [text, []]
+    parts = text.split(_IMAGE_MARK)
+    return ["".join(parts[0::2]), parts[1::2]]
+
+
+def normalize(text) -> list:
+    """Converts HTML of a field to plain text in one pass.
+
+    Tags and sounds are removed, <br> becomes a new line, named and numeric entities
+    are decoded and the sources of <img> tags are extracted.
+
+    Args:
+        text (str): HTML of the field
+
+    Returns:
+        list: [text, images]
+    """
+    return _splitImages(_replaceAll(text))
+
+
+def normalizeBatch(notes) -> list:
+    """Normalizes all fields of many notes in one pass.
+
+    Args:
+        notes (list): Fields of the notes, joined by FIELD_SEPARATOR as stored by Anki
+
+    Returns:
+        list: For every note the list of [text, images] of its fields
+    """
+    fields = _replaceAll(FIELD_SEPARATOR.join(notes)).split(FIELD_SEPARATOR)
+    normalized = []
+    start = 0
+    for note in notes:
+        end = start+note.count(FIELD_SEPARATOR)+1
+        normalized.append([_splitImages(field)
+                          for field in fields[start:end]])
+        start = end
+    return normalized
@@ -0,0 +1,236 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# Path of the trace file, tracing is enabled when it is set
+TRACE_ENV = "ANKITEST_TRACE"
+# Format of the trace file, "chrome" or "json"
+TRACE_FORMAT_ENV = "ANKITEST_TRACE_FORMAT"
+FORMATS = ["chrome", "json"]
+
+_enabled = False
+_path = None
+_format = "chrome"
+_events = []
+_origin = time.perf_counter()
+
+
+class _NoSpan:
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, key, value=1):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    enabled = True
+
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = counts
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        # list.append is atomic, spans of worker threads need no lock
+        _events.append([self.name, self.start, end, os.getpid(), threading.get_ident(),
+                        threading.current_thread().name, self.counts])
+        return False
+
+    def count(self, key, value=1):
+        """Adds the value to a count of the span.
+
+        Args:
+            key (str): Name of the count, for example "cards" or "bytes"
+            value (int, optional): Added value. Defaults to 1.
+        """
+        self.counts[key] = self.counts.get(key, 0)+value
+
+
+def enable(path, format="chrome"):
+    """Enables tracing, the trace is written to path when the program exits.
+
+    Args:
+        path (str): Path of the trace file, None to only record the spans
+        format (str, optional): "chrome" for the trace event format or "json" for a summary
+            of stages. Defaults to "chrome".
+    """
+    global _enabled, _path, _format
+    if format not in FORMATS:
+        raise ValueError(f"Unknown trace format: {format}")
+    if not _enabled:
+        atexit.register(_dumpAtExit)
+    _enabled = True
+    _path = path
+    _format = format
+
+
+def enableFromEnv() -> bool:
+    """Enables tracing if the ANKITEST_TRACE environment variable is set.
+
+    Returns:
+        bool: True if tracing is enabled
+    """
+    path = os.getenv(TRACE_ENV)
+    if path != None and path != "":
+        format = os.getenv(TRACE_FORMAT_ENV, "chrome").lower()
+        enable(path, format if format in FORMATS else "chrome")
+    return _enabled
+
+
+def isEnabled() -> bool:
+    return _enabled
+
+
+def span(name, **counts):
+    """Returns a context manager measuring the stage.
+
+    When tracing is disabled a shared object doing nothing is returned.
+
+    Args:
+        name (str): Name of the stage, for example "Deck.loadCard"
+        **counts: Initial counts of the span
+
+    Returns:
+        _Span: Span, use count() to record cards, images or bytes
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, counts)
+
+
+def traced(name):
+    """Decorator measuring every call of the function as a stage.
+
+    Args:
+        name (str): Name of the stage
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary() -> dict:
+    """Returns the recorded stages.
+
+    Returns:
+        dict: Stage name to calls, total, mean and max time in milliseconds and the sums of
+            its counts
+    """
+    stages = {}
+    for name, start, end, _, _, _, counts in list(_events):
+        stage = stages.setdefault(
+            name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "counts": {}})
+        duration = (end-start)*1000
+        stage["calls"] += 1
+        stage["total_ms"] += duration
+        stage["max_ms"] = max(stage["max_ms"], duration)
+        for key, value in counts.items():
+            stage["counts"][key] = stage["counts"].get(key, 0)+value
+    for stage in stages.values():
+        stage["mean_ms"] = stage["total_ms"]/stage["calls"]
+    return stages
+
+
+def chromeTrace() -> dict:
+    """Returns the recorded spans in the Chrome trace event format.
+
+    The file opens in chrome://tracing or https://ui.perfetto.dev.
+
+    Returns:
+        dict: Trace with complete ("X") events in microseconds
+    """
+    events = []
+    threads = {}
+    for name, start, end, pid, tid, thread, counts in list(_events):
+        threads[pid, tid] = thread
+        events.append({"name": name, "ph": "X", "pid": pid, "tid": tid,
+                       "ts": (start-_origin)*1e6, "dur": (end-start)*1e6, "args": counts})
+    for (pid, tid), thread in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                       "args": {"name": thread}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def dump(path=None, format=None) -> bool:
+    """Writes the trace file.
+
+    Args:
+        path (str, optional): Path of the trace file. Defaults to the path given to enable.
+        format (str, optional): "chrome" or "json". Defaults to the format given to enable.
+
+    Returns:
+        bool: True if the file was written
+    """
+    path = path if path != None else _path
+    format = format if format != None else _format
+    if path == None:
+        return False
+    data = chromeTrace() if format == "chrome" else {"stages": summary()}
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+    except OSError:
+        return False
+    return True
+
+
+def _dumpAtExit():
+    # worker processes return their spans to the main process, see takeEvents
+    if "multiprocessing" in sys.modules and sys.modules["multiprocessing"].parent_process() != None:
+        return
+    dump()
+
+
+def takeEvents() -> list:
+    """Returns the recorded spans and drops them, used to send the spans of a worker process
+    to the main process.
+
+    Returns:
+        list: Recorded spans
+    """
+    events = list(_events)
+    del _events[:len(events)]
+    return events
+
+
+def addEvents(events):
+    """Adds spans recorded by another process.
+
+    perf_counter uses a system-wide clock, so the spans of all processes share one timeline.
+
+    Args:
+        events (list): Spans returned by takeEvents
+    """
+    _events.extend(events)
+
+
+def reset():
+    """Drops the recorded spans.
+    """
+    _events.clear()
+
+
+enableFromEnv()
@@ -0,0 +1,95 @@
+import argparse
+import time
+from ankidata import core as ankidata
+from benchmark import synthetic
+
+
+def legacyLoadSupportedDecks(collection, model) -> list:
+    """Finds the supported decks card by card, as done before the aggregate query.
+
+    Args:
+        collection (Collection): Collection
+        model (str): Model name
+
+    Returns:
+        list: Decks names
+    """
+    decks_with_model = []
+    for deck in collection.decks.all():
+        cards = collection.find_cards(f'deck:"{deck["name"]}"')
+        for card in cards:
+            if collection.get_card(card).note_type()['name'] == model:
+                decks_with_model.append(deck['name'])
+                break
+    return decks_with_model
+
+
+def benchLoadSupportedDecks(decks, notesPerDeck, otherNotesPerDeck) -> dict:
+    """Compares the legacy and the aggregate deck discovery.
+
+    Returns:
+        dict: Timings in seconds
+    """
+    collection = synthetic.createCollection(
+        decks=decks, notesPerDeck=notesPerDeck, otherNotesPerDeck=otherNotesPerDeck)
+    anki = ankidata.AnkiCore()
+    anki.collection = collection
+    anki.init = True
+
+    start = time.perf_counter()
+    legacy = legacyLoadSupportedDecks(collection, anki.model)
+    legacyTime = time.perf_counter()-start
+
+    start = time.perf_counter()
+    anki._loadSupportedDecks()
+    aggregateTime = time.perf_counter()-start
+
+    collection.close()
+    if sorted(legacy) != sorted(anki.getDecksNames()):
+        raise RuntimeError("Deck discovery results differ")
+    return {"legacy": legacyTime, "aggregate": aggregateTime}
+
+
+def benchLoadCard(decks, notesPerDeck) -> dict:
+    """Compares loading a deck without the question cache, with a cold cache and with a warm cache.
+
+    Returns:
+        dict: Timings in seconds
+    """
+    collection = synthetic.createCollection(
+        decks=decks, notesPerDeck=notesPerDeck)
+    result = {}
+    for name, questionCache in [("uncached", False), ("cold", True), ("warm", True)]:
+        anki = ankidata.AnkiCore(questionCache=questionCache)
+        anki.collection = collection
+        anki.init = True
+        anki._loadSupportedDecks()
+        start = time.perf_counter()
+        anki.getDeck(max(anki.getDecksNames(),
+                         key=anki.getDeckQuestionsNum)).loadCard()
+        result[name] = time.perf_counter()-start
+        if anki.getQuestionCache() != None:
+            anki.getQuestionCache().close()
+    collection.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of supported decks discovery")
+    parser.add_argument("--decks", type=int, default=50)
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--other-notes", type=int, default=200)
+    args = parser.parse_args()
+    result = benchLoadSupportedDecks(
+        args.decks, args.notes, args.other_notes)
+    print(f"legacy:    {result['legacy']:.4f} s")
+    print(f"aggregate: {result['aggregate']:.4f} s")
+    print(f"speedup:   {result['legacy']/result['aggregate']:.1f}x")
+    result = benchLoadCard(args.decks, args.notes)
+    for name, seconds in result.items():
+        print(f"loadCard {name}: {seconds:.4f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+# Writers of the docx file, the value is the streaming argument of exportAnki
+BACKENDS = {"python-docx": False, "streaming": True}
+
+
+def createRecords(questions, answersPerQuestion, imageShare, imageSize, seed=0):
+    """Yields questions with unique PNG images, so the media parts are not deduplicated.
+
+    Yields:
+        list: [question, answers, correct, images]
+    """
+    import PIL.Image
+    rand = random.Random(seed)
+    for n in range(questions):
+        question = f"Question {n}: which statement about topic {rand.randrange(1000)} is correct?"
+        answers = [f"Statement {a} about item {rand.randrange(100000)}" for a in range(answersPerQuestion)]
+        images = []
+        if rand.random() < imageShare:
+            out = io.BytesIO()
+            PIL.Image.new("RGB", imageSize, (n % 256, n//256 % 256, rand.randrange(256))).save(out, format="PNG")
+            images.append(out.getvalue())
+        yield [question, answers, 1 << rand.randrange(answersPerQuestion), images]
+
+
+def runBackend(backend, path, questions, answersPerQuestion, imageShare, imageSize) -> dict:
+    """Exports the questions with one writer, in a fresh process so the peak memory is its own.
+
+    Returns:
+        dict: Seconds, peak resident memory in bytes (None on Windows) and size of the file
+    """
+    from docxsave import core as docxsave
+    records = createRecords(questions, answersPerQuestion, imageShare, imageSize)
+    start = time.perf_counter()
+    exporter = docxsave.exportAnki(path, processImages=False, streaming=BACKENDS[backend])
+    if exporter.exportStream(records, "Benchmark") == False:
+        raise RuntimeError("Export failed")
+    seconds = time.perf_counter()-start
+    peak = None
+    try:
+        import resource
+        # kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == "darwin" else peak*1024
+    except ImportError:
+        pass
+    return {"seconds": seconds, "peak_bytes": peak, "file_bytes": os.path.getsize(path)}
+
+
+def sameDocument(first, second) -> bool:
+    """Compares the parts of two docx files, XML parts are compared in canonical form.
+
+    Returns:
+        bool: True if every part has the same content
+    """
+    from lxml import etree
+    parser = etree.XMLParser(remove_blank_text=True)
+    with zipfile.ZipFile(first) as a, zipfile.ZipFile(second) as b:
+        if sorted(a.namelist()) != sorted(b.namelist()):
+            return False
+        for name in a.namelist():
+            x, y = a.read(name), b.read(name)
+            if name == "[Content_Types].xml":
+                # python-docx sorts the content types
+                x = sorted(etree.tostring(e, method="c14n") for e in etree.fromstring(x, parser))
+                y = sorted(etree.tostring(e, method="c14n") for e in etree.fromstring(y, parser))
+            elif name.endswith((".xml", ".rels")):
+                x = etree.tostring(etree.fromstring(x, parser), method="c14n")
+                y = etree.tostring(etree.fromstring(y, parser), method="c14n")
+            if x != y:
+                return False
+    return True
+
+
+def benchExport(questions, answersPerQuestion, imageShare, imageSize) -> dict:
+    """Exports the same questions with both writers.
+
+    Returns:
+        dict: Result of every backend and whether the documents are the same
+    """
+    work = tempfile.mkdtemp()
+    try:
+        results = {}
+        for backend in BACKENDS:
+            path = os.path.join(work, backend+".docx")
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmark.export", "--run", backend, "--path", path,
+                 "--questions", str(questions), "--answers", str(answersPerQuestion),
+                 "--image-share", str(imageShare), "--image-size", f"{imageSize[0]}x{imageSize[1]}"],
+                capture_output=True, text=True, check=True)
+            results[backend] = json.loads(output.stdout.splitlines()[-1])
+        results["same"] = sameDocument(*[os.path.join(work, backend+".docx") for backend in BACKENDS])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the python-docx and streaming docx writers")
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--answers", type=int, default=4)
+    parser.add_argument("--image-share", type=float, default=0.2,
+                        help="share of questions with an image, 0-1")
+    parser.add_argument("--image-size", type=lambda value: tuple(int(x) for x in value.split("x")),
+                        default=(320, 240))
+    parser.add_argument("--run", choices=BACKENDS, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--path", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run != None:
+        print(json.dumps(runBackend(args.run, args.path, args.questions,
+                                    args.answers, args.image_share, args.image_size)))
+        return
+    results = benchExport(args.questions, args.answers, args.image_share, args.image_size)
+    for backend in BACKENDS:
+        result = results[backend]
+        peak = f"{result['peak_bytes']/1024/1024:8.1f} MiB peak" if result["peak_bytes"] != None else ""
+        print(f"{backend:12s} {result['seconds']:8.2f} s {peak} {result['file_bytes']/1024/1024:8.1f} MiB file")
+    print(f"speedup: {results['python-docx']['seconds']/results['streaming']['seconds']:.1f}x")
+    print("same document" if results["same"] else "documents differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import statistics
+import time
+from ankidata import core as ankidata
+from benchmark import synthetic
+
+
+def benchTransitions(questions) -> list:
+    """Answers every question of a synthetic deck in the GUI and measures the transitions.
+
+    A transition is the time from clicking "Next Question" until the next question is drawn.
+    A display is required.
+
+    Returns:
+        list: Transition times in seconds
+    """
+    from gui.core import Gui
+    collection = synthetic.createCollection(decks=1, notesPerDeck=questions)
+    anki = ankidata.AnkiCore(questionCache=False)
+    anki.collection = collection
+    anki.init = True
+    anki._loadSupportedDecks()
+    gui = Gui(anki, run=False)
+    gui.startTest("Synthetic::Deck 0")
+    gui.window.update()
+    times = []
+    for _ in range(gui.deck.getQuestionsNum()-1):
+        gui.checkboxes[0].set(1)
+        start = time.perf_counter()
+        gui.nextQuestion()
+        gui.window.update()
+        times.append(time.perf_counter()-start)
+    gui.window.destroy()
+    collection.close()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of question transitions in the GUI")
+    parser.add_argument("--questions", type=int, default=500)
+    args = parser.parse_args()
+    session = benchTransitions(args.questions)
+    times = sorted(session)
+    print(f"transitions: {len(times)}")
+    print(f"mean:   {statistics.mean(times)*1000:.1f} ms")
+    print(f"median: {times[len(times)//2]*1000:.1f} ms")
+    print(f"p95:    {times[int(len(times)*0.95)]*1000:.1f} ms")
+    print(f"max:    {times[-1]*1000:.1f} ms")
+    # growing times over the session show leaking widgets
+    print(f"first 50 mean: {statistics.mean(session[:50])*1000:.1f} ms")
+    print(f"last 50 mean:  {statistics.mean(session[-50:])*1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import gc
+import random
+import tracemalloc
+from ankidata.store import QuestionStore
+
+
+def createQuestions(questions, answersPerQuestion, seed=0):
+    """Yields parsed questions similar to a certification bank.
+
+    Yields:
+        list: [question, answers, correct, images]
+    """
+    rand = random.Random(seed)
+    for n in range(questions):
+        question = f"Question {n}: which statement about topic {rand.randrange(1000)} is correct?"
+        if rand.random() < 0.3:
+            # parsed notes give a new string object for every answer
+            answers = [str(value) for value in (True, False)]
+        else:
+            answers = [f"Statement {a} about item {rand.randrange(100000)}"
+                       for a in range(answersPerQuestion)]
+        images = [f"image{n}.png"] if rand.random() < 0.1 else []
+        yield [question, answers, 1 << rand.randrange(len(answers)), images]
+
+
+def _measure(build) -> int:
+    """Returns the memory allocated by build and still held by its result.
+
+    Returns:
+        int: Size in bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def legacyLayout(records) -> list:
+    """Builds the parallel lists used by Deck before the question store.
+
+    Returns:
+        list: [questions, answers, correct, images]
+    """
+    questions, answers, correct, images = [], [], [], []
+    for question, answer, mask, image in records:
+        questions.append(question)
+        answers.append(answer)
+        correct.append([i for i in range(len(answer)) if (mask >> i) & 1])
+        images.append(image)
+    return [questions, answers, correct, images]
+
+
+def storeLayout(records) -> QuestionStore:
+    """Builds the question store.
+
+    Returns:
+        QuestionStore: Store
+    """
+    store = QuestionStore()
+    for question, answers, mask, images in records:
+        store.append(question, answers, mask, images)
+    return store
+
+
+def benchMemory(questions, answersPerQuestion) -> dict:
+    """Compares the memory of the legacy parallel lists and the question store.
+
+    Returns:
+        dict: Sizes in bytes
+    """
+    return {
+        "legacy": _measure(lambda: legacyLayout(createQuestions(questions, answersPerQuestion))),
+        "store": _measure(lambda: storeLayout(createQuestions(questions, answersPerQuestion))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the memory used by loaded questions")
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--answers", type=int, default=4)
+    args = parser.parse_args()
+    result = benchMemory(args.questions, args.answers)
+    for name, size in result.items():
+        print(f"{name}: {size/1024/1024:.1f} MiB")
+    print(f"ratio: {result['legacy']/result['store']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
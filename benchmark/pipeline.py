@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from ankidata import core as ankidata
+from ankidata import trace
+from benchmark import synthetic
+
+# Version of the report format
+REPORT_VERSION = 1
+# Deck holding all synthetic decks
+ROOT_DECK = "Synthetic"
+
+
+def benchInit(path) -> list:
+    """Opens the collection read-only and discovers the decks.
+
+    Args:
+        path (str): Path of collection.anki2
+
+    Returns:
+        list: [AnkiCore, seconds]
+    """
+    start = time.perf_counter()
+    anki = ankidata.AnkiCore(collectionPath=path, readOnly=True)
+    status = anki.Init()
+    seconds = time.perf_counter()-start
+    if status != 0:
+        raise RuntimeError(f"AnkiCore.Init failed with status {status}")
+    return [anki, seconds]
+
+
+def benchLoadCard(anki, sample=None) -> list:
+    """Loads the deck holding all synthetic decks.
+
+    Args:
+        anki (AnkiCore): Initialized AnkiCore
+        sample (int, optional): Number of questions drawn at random. Defaults to None, all questions.
+
+    Returns:
+        list: [Deck, seconds]
+    """
+    deck = anki.getDeck(ROOT_DECK, sample, seed=0)
+    start = time.perf_counter()
+    status = deck.loadCard()
+    seconds = time.perf_counter()-start
+    if status != 0:
+        raise RuntimeError(f"Deck.loadCard failed with status {status}")
+    return [deck, seconds]
+
+
+def benchSession(deck, seed=0) -> list:
+    """Answers every question of the deck without a display.
+
+    Every question is prepared as the GUI does it (answers in the order of the session,
+    decoded and resized images), then answered at random.
+
+    Args:
+        deck (Deck): Loaded deck
+        seed (int, optional): Seed of the chosen answers. Defaults to 0.
+
+    Returns:
+        list: Time of every question in seconds
+    """
+    from ankidata.session import Session
+    from gui.prefetch import QuestionPrefetcher
+    rand = random.Random(seed)
+    session = Session(deck, seed)
+    prefetcher = QuestionPrefetcher(session, window=0)
+    times = []
+    try:
+        for index in range(deck.getQuestionsNum()):
+            start = time.perf_counter()
+            prefetcher.get(index)
+            answers = session.getAnswers()
+            session.updateScore([i for i in range(len(answers)) if rand.random() < 0.5])
+            session.nextQuestion()
+            times.append(time.perf_counter()-start)
+    finally:
+        prefetcher.close()
+    return times
+
+
+def benchExport(deck, path, imageCache) -> float:
+    """Exports the deck to docx.
+
+    Args:
+        deck (Deck): Loaded deck
+        path (str): Path of the docx file
+        imageCache (str): Folder of processed images
+
+    Returns:
+        float: Seconds
+    """
+    from docxsave import core as docxsave
+    from docxsave.images import ImageStage
+    start = time.perf_counter()
+    if docxsave.exportAnki(path, ImageStage(cacheDir=imageCache)).exportDeck(deck) == False:
+        raise RuntimeError("Export failed")
+    return time.perf_counter()-start
+
+
+def runOnce(path, work, seed, sample) -> dict:
+    """Measures every stage of the pipeline once, with empty question and image caches.
+
+    Args:
+        path (str): Path of collection.anki2
+        work (str): Temporary folder of the run
+        seed (int): Seed of the session
+        sample (int): Number of questions of the sampled load
+
+    Returns:
+        dict: Measured values
+    """
+    for name in os.listdir(os.path.dirname(path)):
+        if name.endswith(ankidata.QUESTION_CACHE_SUFFIX):
+            os.remove(os.path.join(os.path.dirname(path), name))
+    anki, initTime = benchInit(path)
+    sampleTime = benchLoadCard(anki, sample)[1]
+    deck, coldTime = benchLoadCard(anki)
+    warmTime = benchLoadCard(anki)[1]
+    session = benchSession(deck, seed)
+    docx = os.path.join(work, "export.docx")
+    imageCache = tempfile.mkdtemp(dir=work)
+    exportTime = benchExport(deck, docx, imageCache)
+    # the second export finds the processed images in the cache
+    cachedExportTime = benchExport(deck, docx, imageCache)
+    result = {
+        "init_s": initTime,
+        "load_cold_s": coldTime,
+        "load_warm_s": warmTime,
+        "load_sample_s": sampleTime,
+        "session_s": sum(session),
+        "session_question_median_ms": statistics.median(session)*1000,
+        "session_question_p95_ms": sorted(session)[int(len(session)*0.95)]*1000,
+        "export_s": exportTime,
+        "export_cached_images_s": cachedExportTime,
+        "export_bytes": os.path.getsize(docx),
+        "questions": deck.getQuestionsNum(),
+    }
+    anki.collection.close()
+    if anki.getQuestionCache() != None:
+        anki.getQuestionCache().close()
+    return result
+
+
+def runSuite(decks=10, notesPerDeck=100, answersPerNote=4, imageShare=0.2, imageSizes=synthetic.IMAGE_SIZES,
+             repeat=3, seed=0, sample=30) -> dict:
+    """Creates a synthetic collection and measures the whole pipeline.
+
+    Args:
+        decks (int, optional): Number of decks. Defaults to 10.
+        notesPerDeck (int, optional): Number of notes in every deck. Defaults to 100.
+        answersPerNote (int, optional): Number of answers of every note. Defaults to 4.
+        imageShare (float, optional): Share of notes with an image, 0-1. Defaults to 0.2.
+        imageSizes (list, optional): Sizes of images in pixels. Defaults to synthetic.IMAGE_SIZES.
+        repeat (int, optional): Number of runs, the report holds the median and the minimum. Defaults to 3.
+        seed (int, optional): Seed of the collection and the session. Defaults to 0.
+        sample (int, optional): Number of questions of the sampled load, before the full load. Defaults to 30.
+
+    Returns:
+        dict: Report
+    """
+    work = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work, "collection.anki2")
+        start = time.perf_counter()
+        collection = synthetic.createCollection(path, decks, notesPerDeck, answersPerNote,
+                                                seed=seed, imageShare=imageShare, imageSizes=imageSizes)
+        media = collection.media.dir()
+        collection.close()
+        createTime = time.perf_counter()-start
+        images = [os.path.getsize(os.path.join(media, name)) for name in os.listdir(media)]
+        runs = []
+        for _ in range(repeat):
+            trace.reset()
+            runs.append(runOnce(path, work, seed, sample))
+        stages = trace.summary() if trace.isEnabled() else None
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    results = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        results[key] = {"median": statistics.median(values), "min": min(values)}
+    report = {
+        "version": REPORT_VERSION,
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"decks": decks, "notes_per_deck": notesPerDeck, "answers_per_note": answersPerNote,
+                     "image_share": imageShare, "image_sizes": [list(size) for size in imageSizes],
+                     "repeat": repeat, "seed": seed, "sample": sample},
+        "collection": {"create_s": createTime, "images": len(images), "image_bytes": sum(images)},
+        "results": results,
+    }
+    if stages != None:
+        report["stages"] = stages
+    return report
+
+
+def compare(report, baseline) -> list:
+    """Compares the medians of two reports.
+
+    Args:
+        report (dict): New report
+        baseline (dict): Report of the compared commit
+
+    Returns:
+        list: [name, baseline median, new median, ratio new/baseline] for every common value
+    """
+    rows = []
+    for name, value in report["results"].items():
+        if name not in baseline.get("results", {}):
+            continue
+        old = baseline["results"][name]["median"]
+        rows.append([name, old, value["median"],
+                     value["median"]/old if old != 0 else None])
+    return rows
+
+
+def _commit() -> str:
+    """Returns the git commit of the benchmarked code.
+
+    Returns:
+        str: Commit hash, or None outside of a git checkout
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def _parseSizes(value) -> list:
+    return [tuple(int(x) for x in size.split("x")) for size in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the whole pipeline on a synthetic collection")
+    parser.add_argument("--decks", type=int, default=10)
+    parser.add_argument("--notes", type=int, default=100,
+                        help="notes per deck")
+    parser.add_argument("--answers", type=int, default=4,
+                        help="answers per note")
+    parser.add_argument("--image-share", type=float, default=0.2,
+                        help="share of notes with an image, 0-1")
+    parser.add_argument("--image-sizes", type=_parseSizes,
+                        default=synthetic.IMAGE_SIZES, help="for example 320x240,2560x1600")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample", type=int, default=30,
+                        help="questions drawn for the sampled load")
+    parser.add_argument("--stages", action="store_true",
+                        help="add the timings of every stage of the last run recorded by ankidata.trace")
+    parser.add_argument("--output", default=None,
+                        help="path of the json report")
+    parser.add_argument("--compare", default=None,
+                        help="json report of another commit")
+    args = parser.parse_args()
+    if args.stages and not trace.isEnabled():
+        trace.enable(None, "json")
+    report = runSuite(args.decks, args.notes, args.answers, args.image_share, args.image_sizes,
+                      args.repeat, args.seed, args.sample)
+    if args.output != None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    print(f"{report['results']['questions']['median']:.0f} questions, "
+          f"{report['collection']['images']} images ({report['collection']['image_bytes']/1024/1024:.1f} MiB)")
+    for name, value in report["results"].items():
+        if name != "questions":
+            print(f"{name:28s} {value['median']:12.4f} (min {value['min']:.4f})")
+    if args.compare != None:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print("\nwarning: the settings of the reports differ")
+        print(f"\ncompared to {baseline.get('commit')}:")
+        for name, old, new, ratio in compare(report, baseline):
+            if ratio != None:
+                print(f"{name:28s} {old:12.4f} -> {new:12.4f}  {ratio:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that must not be imported before the window is shown
+DEFERRED_MODULES = ["anki", "docx", "lxml"]
+
+_FIRST_FRAME = """
+import sys, time
+began = time.perf_counter()
+import start.core
+imported = time.perf_counter()
+print("import", imported-began)
+print("loaded", ",".join(m for m in sys.argv[1].split(",") if m in sys.modules))
+try:
+    from gui.core import Gui
+    gui = Gui(run=False)
+    gui.window.update()
+    print("frame", time.perf_counter()-began)
+    gui.init_cancel.set()
+    gui.window.destroy()
+except Exception as e:
+    print("noframe", type(e).__name__)
+"""
+
+
+def importTimes(module="start.core") -> list:
+    """Imports the module in a new interpreter with -X importtime.
+
+    Args:
+        module (str, optional): Imported module. Defaults to "start.core".
+
+    Returns:
+        list: [cumulative microseconds, self microseconds, module] sorted by cumulative time
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=_root(), check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times.append([int(cumulative), int(own), name.rstrip()])
+    times.sort(key=lambda row: row[0], reverse=True)
+    return times
+
+
+def firstFrame() -> dict:
+    """Starts the application in a new interpreter and measures the time to the first frame.
+
+    Without a display only the import time is measured.
+
+    Returns:
+        dict: import and frame times in seconds (frame is None without a display) and
+            the deferred modules that were imported anyway
+    """
+    result = subprocess.run([sys.executable, "-c", _FIRST_FRAME, ",".join(DEFERRED_MODULES)],
+                            capture_output=True, text=True, cwd=_root(), check=True)
+    measured = {"import": None, "frame": None, "loaded": []}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition(" ")
+        if key == "import" or key == "frame":
+            measured[key] = float(value)
+        elif key == "loaded" and value != "":
+            measured["loaded"] = value.split(",")
+    return measured
+
+
+def _root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the application start")
+    parser.add_argument("--top", type=int, default=15,
+                        help="number of slowest imports shown")
+    args = parser.parse_args()
+    print("slowest imports of start.core (cumulative / self):")
+    for cumulative, own, name in importTimes()[:args.top]:
+        print(f"{cumulative/1000:9.1f} ms {own/1000:9.1f} ms  {name}")
+    measured = firstFrame()
+    print(f"\nimport start.core: {measured['import']*1000:.1f} ms")
+    if measured["frame"] != None:
+        print(f"first frame:       {measured['frame']*1000:.1f} ms")
+    else:
+        print("first frame:       no display, not measured")
+    if len(measured["loaded"]) > 0:
+        print("deferred modules imported at start: "+", ".join(measured["loaded"]))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+from anki.collection import Collection
+import io
+import os
+import random
+import tempfile
+from ankidata.core import MODEL_NAME
+
+# Sizes of generated images in pixels, the size of an image is chosen at random
+IMAGE_SIZES = [(320, 240), (1024, 768), (2560, 1600)]
+
+
+def createCollection(path=None, decks=10, notesPerDeck=100, answersPerNote=4, otherNotesPerDeck=0, seed=0,
+                     imageShare=0.0, imageSizes=IMAGE_SIZES) -> Collection:
+    """Creates a synthetic collection with the test model.
+
+    Args:
+        path (str, optional): Path of collection.anki2. Defaults to a new temporary directory.
+        decks (int, optional): Number of decks. Defaults to 10.
+        notesPerDeck (int, optional): Number of notes of the test model in every deck. Defaults to 100.
+        answersPerNote (int, optional): Number of answers of every note. Defaults to 4.
+        otherNotesPerDeck (int, optional): Number of notes of another model added before the test notes of every deck. Defaults to 0.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+        imageShare (float, optional): Share of test notes with an image in the question, 0-1. Defaults to 0.
+        imageSizes (list, optional): Sizes of images in pixels. Defaults to IMAGE_SIZES.
+
+    Returns:
+        Collection: Opened collection
+    """
+    if path == None:
+        path = os.path.join(tempfile.mkdtemp(), 'collection.anki2')
+    rand = random.Random(seed)
+    collection = Collection(path)
+    model = _addTestModel(collection, answersPerNote)
+    basic = collection.models.by_name('Basic')
+    for d in range(decks):
+        did = collection.decks.id(f"Synthetic::Deck {d}")
+        for n in range(otherNotesPerDeck):
+            note = collection.new_note(basic)
+            note.fields = [f"Front {n}", f"Back {n}"]
+            collection.add_note(note, did)
+        for n in range(notesPerDeck):
+            note = collection.new_note(model)
+            answers = [f"Answer {a} of {d}/{n}" for a in range(answersPerNote)]
+            correct = "".join(chr(65+a) for a in range(answersPerNote)
+                              if rand.random() < 0.5) or "A"
+            question = f"Question {n} of deck {d}<br>&nbsp;?"
+            if rand.random() < imageShare:
+                name = f"synthetic_{d}_{n}.jpg"
+                collection.media.write_data(
+                    name, createImage(rand.choice(imageSizes), rand))
+                question += f'<img src="{name}">'
+            note.fields = [question] + answers + [correct]
+            collection.add_note(note, did)
+    return collection
+
+
+def createImage(size, rand) -> bytes:
+    """Creates a JPEG image with gradients and noise, so it compresses like a photo or a scan.
+
+    Args:
+        size (tuple): Width and height in pixels
+        rand (random.Random): Random generator
+
+    Returns:
+        bytes: JPEG image
+    """
+    import PIL.Image
+    import PIL.ImageDraw
+    width, height = size
+    img = PIL.Image.linear_gradient("L").resize(size).convert("RGB")
+    noise = PIL.Image.effect_noise(size, 40).convert("RGB")
+    img = PIL.Image.blend(img, noise, 0.3)
+    draw = PIL.ImageDraw.Draw(img)
+    for _ in range(20):
+        x, y = rand.randrange(width), rand.randrange(height)
+        draw.rectangle([x, y, x+width//8, y+height//8],
+                       fill=(rand.randrange(256), rand.randrange(256), rand.randrange(256)))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def _addTestModel(collection, answersPerNote) -> dict:
+    """Adds the test model to the collection.
+
+    Args:
+        collection (Collection): Collection
+        answersPerNote (int): Number of answer fields
+
+    Returns:
+        dict: Model
+    """
+    models = collection.models
+    model = models.new(MODEL_NAME)
+    for name in ["Question"] + [chr(65+a) for a in range(answersPerNote)] + ["Correct"]:
+        models.add_field(model, models.new_field(name))
+    template = models.new_template("Card 1")
+    template['qfmt'] = "{{Question}}"
+    template['afmt'] = "{{Correct}}"
+    models.add_template(model, template)
+    models.add(model)
+    return models.by_name(MODEL_NAME)
@@ -0,0 +1,105 @@
+import argparse
+import random
+import re
+import time
+from ankidata import text
+from benchmark import synthetic
+
+_LEGACY_ENTITIES = [("<br>", "\n"), ("<br/>", "\n"), ("<br />", "\n"), ("<br >", "\n"), ("&nbsp;", " "),
+                    ("&lt;", "<"), ("&gt;", ">"), ("&amp;", "&"), ("&quot;", "\""), ("&apos;", "'"),
+                    ("&cent;", "¢"), ("&pound;", "£"), ("&yen;", "¥"), ("&euro;", "€"), ("&copy;", "©"),
+                    ("&reg;", "®"), ("&trade;", "™"), ("&times;", "×"), ("&divide;", "÷"),
+                    ("&ndash;", "–"), ("&mdash;", "—"), ("&lsquo;", "‘"), ("&rsquo;", "’"),
+                    ("&sbquo;", "‚"), ("&ldquo;", "“"), ("&rdquo;", "”"), ("&bdquo;", "„"),
+                    ("&laquo;", "«"), ("&raquo;", "»")]
+
+
+def legacyParse(collection, fields) -> list:
+    """Parses the fields of a note as done before the single pass normalization.
+
+    Args:
+        collection (Collection): Collection, used to strip media
+        fields (list): Fields of the note
+
+    Returns:
+        list: [question, answers, images]
+    """
+    images = [match.group(1)
+              for match in re.finditer(r'<img src="([^"]+)"', fields[0])]
+    question = collection.media.strip(fields[0])
+    strings = [question] + [x for x in fields[1:-1] if x != ""]
+    for i in range(len(strings)):
+        for old, new in _LEGACY_ENTITIES:
+            strings[i] = strings[i].replace(old, new)
+    return [strings[0], strings[1:], images]
+
+
+def createNotes(notes, answersPerNote, seed=0) -> list:
+    """Creates fields of notes with HTML as written by the Anki editor.
+
+    Returns:
+        list: Fields of the notes joined by text.FIELD_SEPARATOR
+    """
+    rand = random.Random(seed)
+    words = ["Which", "value", "of", "the", "function", "returns", "10", "is", "correct",
+             "when", "called", "with", "argument", "and", "result", "for", "input"]
+    markup = ["<b>value</b>", "x&nbsp;&lt;", "&amp;", "&ldquo;correct&rdquo;", "<br>",
+              "<i>function</i>", "&mdash;", "&#8364;", "<div>text</div>",
+              # raw comparisons written without the editor, a tag must not span two fields
+              "a<b", "c>d", "[sound:"]
+
+    def sentence(length):
+        return " ".join(rand.choice(markup) if rand.random() < 0.15 else rand.choice(words)
+                        for _ in range(length))
+    created = []
+    for n in range(notes):
+        question = sentence(40)
+        if rand.random() < 0.3:
+            question += f'<img src="image{n}.png">'
+        answers = [sentence(8) for _ in range(answersPerNote)]
+        created.append(text.FIELD_SEPARATOR.join(
+            [question] + answers + ["AC"]))
+    return created
+
+
+def benchNormalize(notes, answersPerNote) -> dict:
+    """Compares the legacy chained replacements with the single pass normalization.
+
+    Returns:
+        dict: Timings in seconds
+    """
+    collection = synthetic.createCollection(decks=0)
+    flds = createNotes(notes, answersPerNote)
+
+    start = time.perf_counter()
+    for note in flds:
+        legacyParse(collection, note.split(text.FIELD_SEPARATOR))
+    legacyTime = time.perf_counter()-start
+
+    start = time.perf_counter()
+    single = [[text.normalize(field) for field in note.split(text.FIELD_SEPARATOR)] for note in flds]
+    normalizeTime = time.perf_counter()-start
+
+    start = time.perf_counter()
+    batch = text.normalizeBatch(flds)
+    batchTime = time.perf_counter()-start
+    if batch != single:
+        raise AssertionError("normalizeBatch differs from normalize")
+
+    collection.close()
+    return {"legacy": legacyTime, "normalize": normalizeTime, "batch": batchTime}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark of the HTML normalization of notes")
+    parser.add_argument("--notes", type=int, default=3000)
+    parser.add_argument("--answers", type=int, default=5)
+    args = parser.parse_args()
+    result = benchNormalize(args.notes, args.answers)
+    for name, seconds in result.items():
+        print(f"{name}: {seconds:.4f} s ({result['legacy']/seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,44 @@
+from ankidata import trace
 import docx as dx
+from docx.image.image import Image
+import hashlib
 import io
-import base64
-import PIL
+import os
+import re
+import shutil
+import tempfile
+from xml.sax.saxutils import escape
+import zipfile
+from docxsave import formats
+from docxsave.formats import Exporter, isCorrect
+from docxsave.images import ImageStage
+
+# Parts of the template written by StreamingDocxSave itself
+_GENERATED_PARTS = {"word/document.xml", "word/_rels/document.xml.rels", "[Content_Types].xml"}
+# Characters not allowed in XML 1.0, python-docx refuses them
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+# Tabs and line breaks become their own run elements, as in python-docx
+_RUN_BREAKS = re.compile("(\t|\r|\n)")
+_HEADING = '<w:p><w:pPr><w:pStyle w:val="{style}"/></w:pPr>{run}</w:p>'
+_PARAGRAPH = '<w:p>{run}</w:p>'
+_CORRECT_RUN = '<w:r><w:rPr><w:b/><w:highlight w:val="yellow"/></w:rPr>{content}</w:r>'
+_RUN = '<w:r>{content}</w:r>'
+_PICTURE = (
+    '<w:p><w:r><w:drawing><wp:inline xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{id}" name="Picture {id}"/>'
+    '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+    '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture"><pic:pic>'
+    '<pic:nvPicPr><pic:cNvPr id="0" name="{name}"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="{rId}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+    '<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm><a:prstGeom prst="rect"/></pic:spPr>'
+    '</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>')
+_IMAGE_RELATIONSHIP = ('<Relationship Id="{rId}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                       'relationships/image" Target="media/{name}"/>')
+# Size of the body buffered in memory before it is written to the temporary file
+_BODY_BUFFER = 1 << 16
+# Empty document saved by python-docx, the template of StreamingDocxSave
+_defaultTemplate = None
 
 
 class DocxSave:
@@ -22,11 +59,15 @@ class DocxSave:
         self.doc.add_heading(text, level)
 
     def add_picture(self, img_bytes, width=dx.shared.Inches(5)):
-        self.doc.add_picture(img_bytes)
+        picture = self.doc.add_picture(img_bytes)
+        if width != None and picture.width > width:
+            picture.height = int(picture.height*width/picture.width)
+            picture.width = width
 
     def add_table(self, rows, cols):
         self.doc.add_table(rows, cols)
 
+    @trace.traced("DocxSave.save")
     def save(self):
         try:
             self.doc.save(self.path)
@@ -34,39 +75,386 @@ class DocxSave:
             print("Error while saving file")
             return False
 
+    def discard(self):
+        """Drops the document, nothing was written yet.
+        """
+        self.doc = None
 
-class exportAnki:
-    def __init__(self, path):
+
+class StreamingDocxSave:
+    def __init__(self, path, template=None):
+        """Initializes the StreamingDocxSave object.
+
+        Writes the same document as DocxSave without building it in memory. Paragraphs are
+        formatted from prebuilt XML snippets into a temporary file, images are written to
+        the zip file as soon as they are added. The styles, fonts and settings are copied
+        from the python-docx template, so the document looks the same.
+
+        Args:
+            path (str): Path of the docx file
+            template (str, optional): Path of the template docx. Defaults to an empty python-docx document.
+        """
         self.path = path
-        self.DS = DocxSave(path)
+        self.template = template if template != None else io.BytesIO(_emptyDocument())
+        # cause of the last failed save
+        self.error = None
+        self.partPath = path+".part"
+        self.zip = None
+        self.body = None
+        self.buffer = []
+        self.buffered = 0
+        self.pictures = 0
+        # sha1 of an image to [relationship id, media name], an image added twice is stored once
+        self.media = {}
+        self.extensions = {}
 
-    def export(self, questions, answers, correct, deckName, images):
-        deckName = deckName.replace(" ", "_")
-        deckName = deckName.replace("/", "_")
-        deckName = deckName.replace("\\", "_")
+    def add_paragraph(self, text):
+        self._write(_PARAGRAPH.format(run=_run(_RUN, text)))
 
-        imgObj = []
-        if images != None:
-            for imagepack in images:
-                imgObjTemp = []
-                if imagepack == None or imagepack == "":
-                    continue
-                for image in imagepack:
-                    if image == None or image == "":
-                        continue
-                    decoded_string = io.BytesIO(base64.b64decode(image))
-                    imgObjTemp.append(decoded_string)
-                imgObj.append(imgObjTemp)
-
-        for i in range(len(questions)):
-            self.DS.add_heading(questions[i], level=1)
-            if imgObj[i] != None and imgObj[i] != "":
-                for image in imgObj[i]:
-                    self.DS.add_picture(image)
-            for j in range(len(answers[i])):
-                if j in correct[i]:
-                    self.DS.add_paragraph_correct(answers[i][j])
-                self.DS.add_paragraph(answers[i][j])
+    def add_paragraph_correct(self, text):
+        # python-docx keeps the formatted run of an empty answer
+        self._write(_PARAGRAPH.format(run=_run(_CORRECT_RUN, text, keepEmpty=True)))
+
+    def add_heading(self, text, level=1):
+        self._write(_HEADING.format(style="Title" if level == 0 else f"Heading{level}",
+                                    run=_run(_RUN, text)))
+
+    def add_picture(self, img_bytes, width=dx.shared.Inches(5)):
+        blob = img_bytes.read() if hasattr(img_bytes, "read") else bytes(img_bytes)
+        image = Image.from_blob(blob)
+        cx, cy = image.width, image.height
+        if width != None and cx > width:
+            cy = int(cy*width/cx)
+            cx = width
+        self._open()
+        sha1 = hashlib.sha1(blob).hexdigest()
+        if sha1 not in self.media:
+            name = f"image{len(self.media)+1}.{image.ext}"
+            # JPEG does not shrink any more when deflated
+            self.zip.writestr("word/media/"+name, blob,
+                              zipfile.ZIP_STORED if image.ext == "jpg" else zipfile.ZIP_DEFLATED)
+            self.media[sha1] = [f"rId{self.firstId+len(self.media)}", name]
+            self.extensions[image.ext] = image.content_type
+        self.pictures += 1
+        self._write(_PICTURE.format(cx=cx, cy=cy, id=self.pictures,
+                                    name=f"image.{image.ext}", rId=self.media[sha1][0]))
+
+    @trace.traced("StreamingDocxSave.save")
+    def save(self):
+        try:
+            self._open()
+            self._flush()
+            self._writeDocument()
+            self.zip.close()
+            self.zip = None
+            self.body.close()
+            self.body = None
+            os.replace(self.partPath, self.path)
+        except (OSError, zipfile.BadZipFile, KeyError, ValueError) as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Error while saving file: {self.error}")
+            self.discard()
+            return False
+
+    def discard(self):
+        """Removes the unfinished file, used when the export is cancelled.
+        """
+        if self.zip != None:
+            self.zip.close()
+            self.zip = None
+        if self.body != None:
+            self.body.close()
+            self.body = None
+        if os.path.exists(self.partPath):
+            os.remove(self.partPath)
+
+    def _open(self):
+        """Opens the zip file and copies the parts of the template that do not change.
+        """
+        if self.zip != None:
+            return
+        self.zip = zipfile.ZipFile(self.partPath, "w", zipfile.ZIP_DEFLATED)
+        self.body = tempfile.TemporaryFile()
+        with zipfile.ZipFile(self.template) as template:
+            for info in template.infolist():
+                if info.filename not in _GENERATED_PARTS:
+                    self.zip.writestr(info.filename, template.read(info))
+            document = template.read("word/document.xml").decode("utf-8")
+            self.relationships = template.read("word/_rels/document.xml.rels").decode("utf-8")
+            self.contentTypes = template.read("[Content_Types].xml").decode("utf-8")
+        # the body of the template only holds the section properties, kept at the end
+        bodyStart = document.index("<w:body>")+len("<w:body>")
+        sectionStart = document.index("<w:sectPr", bodyStart)
+        self.header = document[:bodyStart]
+        self.footer = document[sectionStart:]
+        self.firstId = max([int(i) for i in re.findall('Id="rId(\\d+)"', self.relationships)], default=0)+1
+
+    def _write(self, xml):
+        self.buffer.append(xml)
+        self.buffered += len(xml)
+        if self.buffered > _BODY_BUFFER:
+            self._flush()
+
+    def _flush(self):
+        if self.body == None:
+            self._open()
+        self.body.write("".join(self.buffer).encode("utf-8"))
+        self.buffer.clear()
+        self.buffered = 0
+
+    def _writeDocument(self):
+        """Writes document.xml from the body, its relationships and the content types.
+        """
+        with self.zip.open("word/document.xml", "w") as document:
+            document.write(self.header.encode("utf-8"))
+            self.body.seek(0)
+            shutil.copyfileobj(self.body, document)
+            document.write(self.footer.encode("utf-8"))
+        relationships = "".join(_IMAGE_RELATIONSHIP.format(rId=rId, name=name)
+                                for rId, name in self.media.values())
+        self.zip.writestr("word/_rels/document.xml.rels",
+                          self.relationships.replace("</Relationships>", relationships+"</Relationships>"))
+        defaults = "".join(f'<Default Extension="{ext}" ContentType="{contentType}"/>'
+                           for ext, contentType in self.extensions.items()
+                           if f'Extension="{ext}"' not in self.contentTypes)
+        self.zip.writestr("[Content_Types].xml", self.contentTypes.replace("</Types>", defaults+"</Types>"))
+
+
+def _emptyDocument() -> bytes:
+    """Returns an empty document saved by python-docx, made once.
+
+    Returns:
+        bytes: docx file
+    """
+    global _defaultTemplate
+    if _defaultTemplate == None:
+        out = io.BytesIO()
+        dx.Document().save(out)
+        _defaultTemplate = out.getvalue()
+    return _defaultTemplate
+
+
+def _run(template, text, keepEmpty=False) -> str:
+    """Returns the run of the text, formatted like python-docx does it.
+
+    Args:
+        template (str): Run snippet with a {content} field
+        text (str): Text
+        keepEmpty (bool, optional): Return an empty run for an empty text. Defaults to False.
+
+    Returns:
+        str: XML of the run, "" for an empty text
+    """
+    text = _INVALID_XML.sub("", str(text))
+    if text == "" and not keepEmpty:
+        return ""
+    content = []
+    for part in _RUN_BREAKS.split(text):
+        if part == "\t":
+            content.append("<w:tab/>")
+        elif part == "\r" or part == "\n":
+            content.append("<w:br/>")
+        elif part != "":
+            space = ' xml:space="preserve"' if part != part.strip() else ""
+            content.append(f"<w:t{space}>{escape(part)}</w:t>")
+    return template.format(content="".join(content))
+
+
+class DocxExporter(Exporter):
+    extension = ".docx"
+
+    def __init__(self, path, deckName, streaming=False, imageWidth=dx.shared.Inches(5)):
+        """Initializes the DocxExporter object.
+
+        Args:
+            path (str): Path of the docx file
+            deckName (str): Deck name
+            streaming (bool, optional): Write the document with StreamingDocxSave instead of python-docx. Defaults to False.
+            imageWidth (Length, optional): Maximum width of images. Defaults to 5 inches.
+        """
+        super().__init__(path, deckName)
+        self.DS = StreamingDocxSave(path) if streaming else DocxSave(path)
+        self.imageWidth = imageWidth
+
+    def addQuestion(self, question, answers, correct, images):
+        self.DS.add_heading(question, level=1)
+        for image in images:
+            self.DS.add_picture(io.BytesIO(image), self.imageWidth)
+        for j in range(len(answers)):
+            if isCorrect(correct, j):
+                self.DS.add_paragraph_correct(answers[j])
+            self.DS.add_paragraph(answers[j])
+
+    def save(self) -> bool:
         if self.DS.save() == False:
+            self.error = getattr(self.DS, "error", None)
             return False
         return True
+
+    def discard(self):
+        self.DS.discard()
+
+
+# Exporters by format name
+EXPORTERS = {"docx": DocxExporter, **formats.EXPORTERS}
+
+
+def formatOf(path) -> str:
+    """Returns the export format matching the extension of the path.
+
+    Args:
+        path (str): Path of the exported file
+
+    Returns:
+        str: Format name, "docx" for unknown extensions
+    """
+    extension = os.path.splitext(path)[1].lower()
+    for name, exporter in EXPORTERS.items():
+        if exporter.extension == extension:
+            return name
+    return "docx"
+
+
+class exportAnki:
+    def __init__(self, path, imageStage=None, processImages=True, streaming=False, format="docx",
+                 chunkSize=None, inlineImages=False):
+        """Initializes the exportAnki object.
+
+        Args:
+            path (str): Path of the exported file, numbered for every chunk when chunkSize is set
+            imageStage (ImageStage, optional): Resizes and recompresses images. Defaults to ImageStage().
+            processImages (bool, optional): If False the original images are embedded. Defaults to True.
+            streaming (bool, optional): Write docx files with StreamingDocxSave instead of python-docx. Defaults to False.
+            format (str, optional): Name of a format of EXPORTERS, or a function returning an Exporter
+                for a path and a deck name. Defaults to "docx".
+            chunkSize (int, optional): Number of questions of every file, files are named path-0001, path-0002...
+                Defaults to None, one file.
+            inlineImages (bool, optional): Embed images of text formats as data URIs instead of linked
+                files. Defaults to False.
+        """
+        self.path = path
+        self.streaming = streaming
+        self.format = format
+        self.chunkSize = chunkSize
+        self.inlineImages = inlineImages
+        # linked images of all chunks share one folder
+        self.mediaDir = os.path.splitext(path)[0]+"_files"
+        # written files, in order
+        self.paths = []
+        # cause of a failed save, if the exporter knows it
+        self.error = None
+        self.imageStage = None
+        if processImages:
+            self.imageStage = imageStage if imageStage != None else ImageStage()
+
+    def export(self, questions, answers, correct, deckName, images):
+        imgObj = []
+        if images != None:
+            imgObj = list(images)
+        records = ([questions[i], answers[i], correct[i], imgObj[i] if i < len(imgObj) else None]
+                   for i in range(len(questions)))
+        return self.exportStream(records, deckName)
+
+    def _createExporter(self, deckName, chunk) -> Exporter:
+        """Creates the exporter of the chunk.
+
+        Args:
+            deckName (str): Deck name
+            chunk (int): Index of the chunk
+
+        Returns:
+            Exporter: Exporter
+        """
+        path = self.path
+        if self.chunkSize != None:
+            stem, extension = os.path.splitext(self.path)
+            path = f"{stem}-{chunk+1:04d}{extension}"
+        if callable(self.format):
+            return self.format(path, deckName)
+        if self.format == "docx":
+            return DocxExporter(path, deckName, self.streaming,
+                                self.imageStage.width if self.imageStage != None else dx.shared.Inches(5))
+        return EXPORTERS[self.format](path, deckName, self.inlineImages, self.mediaDir)
+
+    def _loadImage(self, image) -> bytes:
+        """Returns the image, processed by the image stage if enabled.
+
+        Args:
+            image (ImageHandle): Image, or its content as bytes
+
+        Returns:
+            bytes: Image
+        """
+        with trace.span("exportAnki.addImage", images=1) as span:
+            if not isinstance(image, (bytes, bytearray, memoryview)):
+                with image.open() as stream:
+                    image = stream.read()
+            span.count("bytes", len(image))
+            if self.imageStage == None:
+                return bytes(image)
+            processed = self.imageStage.process(image)
+            span.count("processedBytes", len(processed))
+            return processed
+
+    def exportDeck(self, deck, progress=None, cancel=None):
+        """Exports the deck, loading the images of one question at a time.
+
+        Args:
+            deck (Deck): Deck, loaded at least partially
+            progress (function, optional): Called with the number of exported questions and the expected total
+            cancel (threading.Event, optional): Stops the export when set
+
+        Returns:
+            bool: True if success, False if error while saving or cancelled
+        """
+        total = deck.AnkiCore.getDeckQuestionsNum(deck.getDeckName())
+        if deck.sample != None:
+            total = min(total, deck.sample)
+        return self.exportStream(deck.iterRecords(), deck.getDeckName(), total, progress, cancel)
+
+    def exportStream(self, records, deckName, total=None, progress=None, cancel=None):
+        """Exports the questions consuming them one at a time.
+
+        When the export is cancelled, the chunks saved before are kept.
+
+        Args:
+            records (iterable): Questions as [question, answers, correct, images], correct is a bitmask
+                or a list of indexes of correct answers
+            deckName (str): Deck name
+            total (int, optional): Expected number of questions, passed to progress
+            progress (function, optional): Called with the number of exported questions and total
+            cancel (threading.Event, optional): Stops the export when set
+
+        Returns:
+            bool: True if success, False if error while saving or cancelled
+        """
+        with trace.span("exportAnki.exportStream") as span:
+            done = 0
+            exporter = self._createExporter(deckName, 0)
+            for question, answers, correct, imagepack in records:
+                if cancel != None and cancel.is_set():
+                    exporter.discard()
+                    return False
+                if self.chunkSize != None and done > 0 and done % self.chunkSize == 0:
+                    if exporter.save() == False:
+                        self.error = exporter.error
+                        return False
+                    self.paths.append(exporter.path)
+                    exporter = self._createExporter(deckName, done//self.chunkSize)
+                images = []
+                if imagepack != None and imagepack != "":
+                    images = [self._loadImage(image) for image in imagepack
+                              if image != None and image != ""]
+                exporter.addQuestion(question, answers, correct, images)
+                done += 1
+                span.count("cards")
+                if progress != None:
+                    progress(done, total)
+            if cancel != None and cancel.is_set():
+                exporter.discard()
+                return False
+            if exporter.save() == False:
+                self.error = exporter.error
+                return False
+            self.paths.append(exporter.path)
+            return True
@@ -0,0 +1,259 @@
+from ankidata import grading
+from abc import ABC, abstractmethod
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+from urllib.parse import quote
+
+# Size of the write buffer of text exports
+_WRITE_BUFFER = 1 << 16
+# Characters with a meaning in Markdown, escaped in questions and answers
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_\[\]<>#|])")
+_HTML_STYLE = ("body{font-family:Calibri,Arial,sans-serif;max-width:50em;margin:auto;padding:1em}"
+               "section{break-inside:avoid}img{max-width:100%}"
+               ".correct{font-weight:bold;background:yellow}")
+
+
+def isCorrect(correct, index) -> bool:
+    """Returns True if the answer is correct.
+
+    Args:
+        correct (int): Bitmask of correct answers, or a list of their indexes
+        index (int): Index of the answer
+
+    Returns:
+        bool: True if the answer is correct
+    """
+    if isinstance(correct, int):
+        return grading.isSet(correct, index)
+    return index in correct
+
+
+def _imageType(data) -> list:
+    """Returns the type of the image from its first bytes.
+
+    Args:
+        data (bytes): Image
+
+    Returns:
+        list: [extension, MIME type]
+    """
+    if data[:3] == b"\xff\xd8\xff":
+        return ["jpg", "image/jpeg"]
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return ["png", "image/png"]
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return ["gif", "image/gif"]
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ["webp", "image/webp"]
+    if data[:2] == b"BM":
+        return ["bmp", "image/bmp"]
+    if b"<svg" in data[:1024]:
+        return ["svg", "image/svg+xml"]
+    return ["bin", "application/octet-stream"]
+
+
+class Exporter(ABC):
+    # Extension of the written files
+    extension = ""
+
+    def __init__(self, path, deckName):
+        """Initializes the Exporter object.
+
+        An exporter writes the questions of one deck to one file, one question at a time.
+        exportAnki feeds it the question stream and calls save at the end, or discard when
+        the export is cancelled.
+
+        Args:
+            path (str): Path of the file
+            deckName (str): Deck name
+        """
+        self.path = path
+        self.deckName = deckName
+        # cause of a failed save, set by save
+        self.error = None
+
+    @abstractmethod
+    def addQuestion(self, question, answers, correct, images):
+        """Adds a question.
+
+        Args:
+            question (str): Question
+            answers (list): Answers
+            correct (int): Bitmask of correct answers, or a list of their indexes
+            images (list): Images as bytes, already processed by the image stage
+        """
+
+    @abstractmethod
+    def save(self) -> bool:
+        """Finishes the file.
+
+        Returns:
+            bool: True if success, False if error while saving
+        """
+
+    @abstractmethod
+    def discard(self):
+        """Removes the unfinished file.
+        """
+
+
+class _TextExporter(Exporter):
+    def __init__(self, path, deckName, inlineImages=False, mediaDir=None):
+        """Initializes the text exporter.
+
+        The file is written as questions are added, to a temporary file renamed by save.
+        Images are written once to the media folder, named by content hash so exports of
+        the same deck give the same files, or embedded as data URIs.
+
+        Args:
+            path (str): Path of the file
+            deckName (str): Deck name
+            inlineImages (bool, optional): Embed images as data URIs. Defaults to False, linked files.
+            mediaDir (str, optional): Folder of linked images. Defaults to the path without extension and "_files".
+        """
+        super().__init__(path, deckName)
+        self.inlineImages = inlineImages
+        self.mediaDir = mediaDir if mediaDir != None else os.path.splitext(path)[0]+"_files"
+        self.partPath = path+".part"
+        self.file = open(self.partPath, "w", encoding="utf-8", newline="\n", buffering=_WRITE_BUFFER)
+        self.file.write(self.header())
+
+    def header(self) -> str:
+        return ""
+
+    def footer(self) -> str:
+        return ""
+
+    def imageSource(self, data) -> str:
+        """Returns the link of the image, writing it to the media folder if needed.
+
+        Args:
+            data (bytes): Image
+
+        Returns:
+            str: Path relative to the exported file, or a data URI
+        """
+        ext, mime = _imageType(data)
+        if self.inlineImages:
+            return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+        name = f"{hashlib.sha1(data).hexdigest()[:16]}.{ext}"
+        path = os.path.join(self.mediaDir, name)
+        if not os.path.exists(path):
+            os.makedirs(self.mediaDir, exist_ok=True)
+            # worker processes exporting other decks may write the same image
+            temp = f"{path}.{os.getpid()}.part"
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        return os.path.relpath(path, os.path.dirname(os.path.abspath(self.path))).replace(os.sep, "/")
+
+    def save(self) -> bool:
+        try:
+            self.file.write(self.footer())
+            self.file.close()
+            os.replace(self.partPath, self.path)
+        except OSError as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Error while saving file: {self.error}")
+            self.discard()
+            return False
+        return True
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.partPath):
+            os.remove(self.partPath)
+
+
+class HtmlExporter(_TextExporter):
+    extension = ".html"
+
+    def header(self) -> str:
+        title = html.escape(self.deckName)
+        return (f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n'
+                f'<style>{_HTML_STYLE}</style>\n</head>\n<body>\n<h1>{title}</h1>\n')
+
+    def footer(self) -> str:
+        return "</body>\n</html>\n"
+
+    def addQuestion(self, question, answers, correct, images):
+        out = [f"<section>\n<h2>{_htmlText(question)}</h2>\n"]
+        for image in images:
+            out.append(f'<p><img src="{html.escape(_link(self.imageSource(image)))}" alt=""></p>\n')
+        out.append('<ol type="A">\n')
+        for j in range(len(answers)):
+            marker = ' class="correct"' if isCorrect(correct, j) else ""
+            out.append(f"<li{marker}>{_htmlText(answers[j])}</li>\n")
+        out.append("</ol>\n</section>\n")
+        self.file.write("".join(out))
+
+
+class MarkdownExporter(_TextExporter):
+    extension = ".md"
+
+    def header(self) -> str:
+        return f"# {_markdownText(self.deckName)}\n\n"
+
+    def addQuestion(self, question, answers, correct, images):
+        out = [f"## {_markdownText(question)}\n\n"]
+        for image in images:
+            out.append(f"![]({_link(self.imageSource(image))})\n\n")
+        for j in range(len(answers)):
+            mark = "x" if isCorrect(correct, j) else " "
+            out.append(f"- [{mark}] {_markdownText(answers[j])}\n")
+        out.append("\n")
+        self.file.write("".join(out))
+
+
+class JsonLinesExporter(_TextExporter):
+    extension = ".jsonl"
+
+    def addQuestion(self, question, answers, correct, images):
+        record = {"deck": self.deckName, "question": question, "answers": list(answers),
+                  "correct": _correctIndexes(correct, len(answers)),
+                  "images": [self.imageSource(image) for image in images]}
+        self.file.write(json.dumps(record, ensure_ascii=False)+"\n")
+
+
+def _correctIndexes(correct, answersNum) -> list:
+    """Returns the indexes of the correct answers.
+
+    Args:
+        correct (int): Bitmask of correct answers, or a list of their indexes
+        answersNum (int): Number of answers
+
+    Returns:
+        list: Indexes in increasing order
+    """
+    if isinstance(correct, int):
+        return [index for index in grading.maskToIndexes(correct) if index < answersNum]
+    return sorted(index for index in correct if index < answersNum)
+
+
+def _link(source) -> str:
+    # paths of linked images may hold spaces, data URIs are left as they are
+    return source if source.startswith("data:") else quote(source)
+
+
+def _htmlText(text) -> str:
+    return html.escape(str(text)).replace("\n", "<br>")
+
+
+def _markdownText(text) -> str:
+    """Returns the text escaped for Markdown, on one line so it stays in its heading or list item.
+
+    Args:
+        text (str): Text
+
+    Returns:
+        str: Escaped text
+    """
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", str(text)).replace("\r", "").replace("\n", "<br>")
+
+
+# Exporters of the text formats, by format name
+EXPORTERS = {"html": HtmlExporter, "md": MarkdownExporter, "jsonl": JsonLinesExporter}
@@ -0,0 +1,123 @@
+from ankidata.profiles import userCacheDir
+import hashlib
+import io
+import os
+import PIL.Image
+import PIL.ImageOps
+
+# Version of the processing, part of the cache key
+_STAGE_VERSION = 2
+# EXIF tag of the orientation of the camera
+_ORIENTATION = 0x0112
+
+
+def defaultCacheDir() -> str:
+    """Returns the folder of processed images.
+
+    Returns:
+        str: Path of the folder
+    """
+    return os.path.join(userCacheDir(), 'images')
+
+
+class ImageStage:
+    def __init__(self, width=None, dpi=150, quality=85, cacheDir=None):
+        """Initializes the ImageStage object.
+
+        The stage resizes images to the page width and recompresses them before they
+        are added to the document. Processed images are cached on disk by content hash
+        and parameters.
+
+        Args:
+            width (Length, optional): Width of images in the document. Defaults to 5 inches.
+            dpi (int, optional): Resolution of images in the document. Defaults to 150.
+            quality (int, optional): JPEG quality, 1-95. Defaults to 85.
+            cacheDir (str, optional): Folder of processed images. Defaults to defaultCacheDir().
+        """
+        if width == None:
+            # python-docx is imported only for the default width
+            from docx.shared import Inches
+            width = Inches(5)
+        self.width = width
+        self.dpi = dpi
+        self.quality = quality
+        self.cacheDir = cacheDir if cacheDir != None else defaultCacheDir()
+        self.maxPixels = int(width.inches*dpi)
+
+    def process(self, data) -> bytes:
+        """Returns the resized and recompressed image.
+
+        Args:
+            data (bytes): Original image
+
+        Returns:
+            bytes: Processed image, or the original image if it is not smaller
+        """
+        key = hashlib.sha256(data)
+        key.update(
+            f"|{_STAGE_VERSION}|{self.maxPixels}|{self.quality}".encode())
+        key = key.hexdigest()
+        path = os.path.join(self.cacheDir, key[:2], key)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+        processed = self._process(data)
+        self._store(path, processed)
+        return processed
+
+    def _process(self, data) -> bytes:
+        """Resizes and recompresses the image.
+
+        Args:
+            data (bytes): Original image
+
+        Returns:
+            bytes: Processed image, or the original image if it is not smaller
+        """
+        try:
+            img = PIL.Image.open(io.BytesIO(data))
+            img.load()
+        except (OSError, PIL.Image.DecompressionBombError):
+            return bytes(data)
+        format = img.format
+        # re-encoding drops EXIF, the orientation is applied to the pixels instead
+        changed = img.getexif().get(_ORIENTATION, 1) != 1
+        if changed:
+            img = PIL.ImageOps.exif_transpose(img)
+        width, height = img.size
+        # transparent images and small drawings stay lossless
+        lossless = img.mode in ("RGBA", "LA", "P", "1") or (
+            format == "PNG" and width*height < 250000)
+        if width > self.maxPixels:
+            height = max(1, int(height*(self.maxPixels/width)))
+            width = self.maxPixels
+            img = img.resize((width, height), PIL.Image.Resampling.LANCZOS)
+            changed = True
+        out = io.BytesIO()
+        if lossless:
+            img.save(out, format="PNG", optimize=True)
+        else:
+            img.convert("RGB").save(out, format="JPEG",
+                                    quality=self.quality, optimize=True)
+        if out.tell() >= len(data) and not changed:
+            return bytes(data)
+        return out.getvalue()
+
+    def _store(self, path, data):
+        """Writes the processed image to the cache.
+
+        Args:
+            path (str): Path in the cache
+            data (bytes): Processed image
+        """
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f"{path}.{os.getpid()}.tmp"
+            with open(temp, 'wb') as f:
+                f.write(data)
+            os.replace(temp, path)
+        except OSError:
+            # the cache is optional
+            pass
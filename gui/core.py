@@ -1,23 +1,55 @@
 from ankidata import core as ankidata
-from docxsave import core as docxsave
+from ankidata import trace
+from ankidata.session import Session
+from gui.decklist import DeckListModel, VirtualDeckList
+from gui.prefetch import QuestionPrefetcher
 import customtkinter as tk
 from customtkinter import filedialog
-import io
-import base64
-import PIL.Image
-import PIL.ImageTk
+import queue
+import threading
+
+# Number of questions prepared in the background after the current one
+PREFETCH_WINDOW = 2
+# Maximum width of question images
+IMAGE_WIDTH = 500
 
 
 class Gui:
-    def __init__(self):
+    def __init__(self, anki=None, run=True):
+        """Creates the window and shows the list of tests.
+
+        Args:
+            anki (AnkiCore, optional): AnkiCore, it is initialized here if needed. Defaults to a new AnkiCore.
+            run (bool, optional): Run the Tk main loop. Defaults to True.
+        """
         tk.set_widget_scaling(1.5)
         self.deck = None
+        self.session = None
         self.test_options = None
         self.tests_list = None
+        self.tests_model = None
+        # decks names the model was built from, a new Init gives a new list
+        self.tests_model_names = None
+        self.startup_view = None
+        self.startup_label = None
+        self.init_cancel = None
         self.test_view = None
+        self.test_canvas = None
         self.test_view_score = None
         self.text_export = None
         self.error_prompt = None
+        self.export_view = None
+        self.export_bar = None
+        self.export_label = None
+        self.export_cancel = None
+        self.export_events = None
+        self.prefetcher = None
+        self.test_counter = None
+        self.test_question = None
+        self.test_images_frame = None
+        self.test_answers_frame = None
+        self.test_images = []
+        self.test_answers = []
         self.checkboxes = []
 
         tk.set_appearance_mode("Dark")
@@ -26,8 +58,68 @@ class Gui:
         self.window.geometry("800x600")
         self.window.resizable(True, True)
 
-        self.anki = ankidata.AnkiCore()
-        status = self.anki.Init()
+        self.anki = anki
+        if self.anki == None:
+            self.anki = ankidata.AnkiCore()
+        if self.anki.init == False:
+            self._startInit()
+        else:
+            self.testList()
+
+        if run:
+            self.window.mainloop()
+
+    def _startInit(self):
+        # the collection is opened on a worker thread, the window stays responsive
+        self.startup_view = tk.CTkFrame(self.window, width=800, height=600)
+        self.startup_view.pack(side="left", fill="both", expand=True)
+        tk.CTkLabel(self.startup_view, text="AnkiTest", font=("Arial", 20)).pack(
+            side="top", fill="x", expand=True)
+        self.startup_label = tk.CTkLabel(self.startup_view, text="Starting")
+        self.startup_label.pack(side="top", fill="x", expand=True)
+        bar = tk.CTkProgressBar(self.startup_view, mode="indeterminate")
+        bar.pack(side="top", fill="x", expand=True)
+        bar.start()
+        tk.CTkButton(self.startup_view, text="Cancel", command=lambda: self._cancelInit()).pack(
+            side="top", fill="x", expand=True, pady=5)
+        self.init_cancel = threading.Event()
+        events = queue.Queue()
+        threading.Thread(target=self._initWorker, args=(
+            events, self.init_cancel), daemon=True).start()
+        self.window.after(50, lambda: self._pollInit(events))
+
+    def _initWorker(self, events, cancel):
+        # runs on the worker thread, it must not touch widgets
+        status = -3
+        try:
+            status = self.anki.Init(progress=lambda stage: events.put(
+                ("stage", stage)), cancel=cancel)
+        finally:
+            events.put(("done", status))
+
+    def _cancelInit(self):
+        self.init_cancel.set()
+        self.window.destroy()
+
+    def _pollInit(self, events):
+        if self.init_cancel.is_set():
+            return
+        while True:
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "stage":
+                self.startup_label.configure(text=event[1]+"...")
+                continue
+            self.startup_view.pack_forget()
+            self.startup_view.destroy()
+            self.startup_view = None
+            self._onInit(event[1])
+            return
+        self.window.after(50, lambda: self._pollInit(events))
+
+    def _onInit(self, status):
         if status == -1:
             self.showError("Path to Anki not found")
             return
@@ -35,22 +127,24 @@ class Gui:
             self.showError("Cannot find Anki database")
             return
         if status == -3:
-            self.showError("Close Anki before running this program")
+            self.showError("Cannot open Anki database, close Anki or start without --direct")
+            return
+        if status == -4:
+            self.showError("No decks with the test model found")
             return
-
         self.testList()
 
-        self.window.mainloop()
-
     def testList(self):
+        self._stopPrefetch()
         self.refreshView()
-        self.tests_list = tk.CTkScrollableFrame(
-            self.window, width=800, height=600, label_anchor="n", label_text="Tests", label_font=("Arial", 20))
+        names = self.anki.getDecksNames()
+        if self.tests_model == None or self.tests_model_names is not names:
+            # search index and collapsed decks are kept between visits
+            self.tests_model = DeckListModel(names, self.anki.decksQuestionsNum)
+            self.tests_model_names = names
+        self.tests_list = VirtualDeckList(
+            self.window, self.tests_model, self.showTestOptions, width=800, height=600)
         self.tests_list.pack(side="left", fill="both", expand=True)
-        tests = self.anki.getDecksNames()
-        for test in tests:
-            tk.CTkButton(self.tests_list, text=test, command=lambda test=test: self.showTestOptions(
-                test)).pack(side="top", fill="both", expand=True, pady=5)
 
     def showTestOptions(self, test):
         self.refreshView()
@@ -60,19 +154,48 @@ class Gui:
         self.test_options.pack(side="left", fill="both", expand=True)
         tk.CTkButton(self.test_options, text="Back to Test Selection", text_color="black",
                      command=lambda: self.testList()).pack(side="left", fill="both", expand=True, pady=5)
+        sample_entry = tk.CTkEntry(
+            self.test_options, placeholder_text="Number of questions (all)")
+        sample_entry.pack(side="left", fill="both", expand=True, pady=5)
         start_test_button = tk.CTkButton(
-            self.test_options, text="Start Test", command=lambda: self.startTest(test))
+            self.test_options, text="Start Test", command=lambda: self.startTest(test, self._parseSample(sample_entry.get())))
         start_test_button.pack(side="left", fill="both", expand=True, pady=5)
 
         export_button = tk.CTkButton(
             self.test_options, text="Export to File", command=lambda: self.exportToFile(test))
         export_button.pack(side="left", fill="both", expand=True, pady=5)
 
-    def startTest(self, test):
+    def _parseSample(self, text):
+        # a positive number draws that many questions, anything else uses the whole deck
+        text = text.strip()
+        if not text.isdigit() or int(text) == 0:
+            return None
+        return int(text)
+
+    def startTest(self, test, sample=None):
         self._hideTestOptions()
-        self.deck = self.anki.getDeck(test)
-        self.deck.loadCard()
+        self.deck = self.anki.getDeck(test, sample)
+        self.deck.loadCard(wait=False)
+        # the order of answers is chosen once per question by the session
+        self.session = Session(self.deck)
+        self._stopPrefetch()
+        self.prefetcher = QuestionPrefetcher(
+            self.session, PREFETCH_WINDOW, IMAGE_WIDTH, tk.ScalingTracker.get_widget_scaling(self.window))
         self.updateTestView()
+        self._loadRemainingQuestions(self.deck)
+
+    def _loadRemainingQuestions(self, deck):
+        # load the rest of the deck in batches while the user answers
+        if deck is not self.deck:
+            return
+        if deck.loadMore():
+            self.window.after(1, lambda: self._loadRemainingQuestions(deck))
+
+    def _stopPrefetch(self):
+        if self.prefetcher == None:
+            return
+        self.prefetcher.close()
+        self.prefetcher = None
 
     def refreshView(self):
         self._hideTestView()
@@ -80,6 +203,7 @@ class Gui:
         self._hideTestOptions()
         self._hideScoreScreen()
         self._hideTestList()
+        self._hideExportView()
         self.window.update()
 
     def _hideTestList(self):
@@ -89,6 +213,13 @@ class Gui:
         self.tests_list.destroy()
         self.tests_list = None
 
+    def _hideExportView(self):
+        if self.export_view == None:
+            return
+        self.export_view.pack_forget()
+        self.export_view.destroy()
+        self.export_view = None
+
     def _hideTestOptions(self):
         if self.test_options == None:
             return
@@ -107,6 +238,9 @@ class Gui:
             self.test_view.pack_forget()
             self.test_view.destroy()
             self.test_view = None
+            self.test_canvas = None
+            self.test_images = []
+            self.test_answers = []
             self.checkboxes = []
 
     def _hideScoreScreen(self):
@@ -116,68 +250,96 @@ class Gui:
         self.test_view_score.destroy()
         self.test_view_score = None
 
+    @trace.traced("Gui.updateTestView")
     def updateTestView(self):
-        self.refreshView()
-        self.deck.shuffle()
-        self.test_view = tk.CTkScrollableFrame(
-            self.window, width=800, height=600, label_anchor="n", label_text=self.deck.getDeckName(), label_font=("Arial", 20))
-        self.test_view.pack(side="left", fill="both", expand=True)
-        tk.CTkButton(self.test_view, text="Back to Test Selection", width=3, height=1,
-                     command=lambda: self.testList(
-                     )).pack(side="top", pady=3)
-        question = self.deck.getQuestion()
-        if question == None:
+        question = self.session.getQuestion()
+        answers = self.session.getAnswers()
+        if question == None or question == "":
             self.refreshView()
             self.showError("No questions found")
             self.testList()
             return
-        if isinstance(question, tuple):
-            question = str(question[0])
-        images = self.deck.getImages()
-        answers = self.deck.getAnswers()
         if answers == None or len(answers) == 0:
             self.refreshView()
             self.showError("No answers found")
             self.testList()
             return
+        index = self.session.getQuestionIndex()
+        prepared = self.prefetcher.get(index)
+        # prepare the next questions while the user answers this one
+        self.prefetcher.request(index+1)
 
-        tk.CTkLabel(self.test_view, text=str(self.deck.getQuestionIndex()+1)+"/"+str(
-            self.deck.getQuestionsNum())+" Question:").pack(side="top", fill="x", expand=True)
-        tk.CTkLabel(self.test_view, text=question, wraplength=500).pack(
-            side="top", fill="x", expand=True)
-        if images != None:
-            for image in images:
-                if image == None or image == "":
-                    continue
-                decoded_string = io.BytesIO(base64.b64decode(image))
-                img = PIL.Image.open(decoded_string)
-                width, height = img.size
-                if width > 500:
-                    height = int(height*(500/width))
-                    width = 500
-
-                imgToDisp = tk.CTkImage(img, size=(width, height))
-
-                tk.CTkLabel(self.test_view, image=imgToDisp, text="").pack(
-                    side="top", fill="x", expand=True)
-
+        if self.test_view == None:
+            self.refreshView()
+            self._buildTestView()
+        # widgets are reused, only their content changes
+        self.test_counter.configure(text=str(index+1)+"/"+str(
+            self.session.getQuestionsNum())+" Question:")
+        self.test_question.configure(text=prepared.question)
+        self._resizePool(self.test_images, len(prepared.images),
+                         lambda: tk.CTkLabel(self.test_images_frame, text=""))
+        for i in range(len(prepared.images)):
+            img, size = prepared.images[i]
+            self.test_images[i].configure(image=tk.CTkImage(img, size=size))
+        self._resizePool(self.test_answers, len(answers), self._createAnswer)
         self.checkboxes = []
-        for answer in answers:
-            self.checkboxes.append(tk.IntVar())
-            tk.IntVar().get()
-            tk.CTkCheckBox(self.test_view, text=answer, variable=self.checkboxes[-1], onvalue=1, offvalue=0
-                           ).pack(side="top", fill="x", expand=True)
-            # a the bottom of the test view
+        for i in range(len(answers)):
+            checkbox, variable = self.test_answers[i]
+            variable.set(0)
+            checkbox.configure(text=answers[i])
+            self.checkboxes.append(variable)
+        self.test_canvas.yview_moveto(0)
+
+    def _buildTestView(self):
+        self.test_view = tk.CTkScrollableFrame(
+            self.window, width=800, height=600, label_anchor="n", label_text=self.deck.getDeckName(), label_font=("Arial", 20))
+        self.test_view.pack(side="left", fill="both", expand=True)
+        # the scrollable frame is placed in a canvas, found through the tkinter widget tree
+        self.test_canvas = self.window.nametowidget(self.test_view.winfo_parent())
+        tk.CTkButton(self.test_view, text="Back to Test Selection", width=3, height=1,
+                     command=lambda: self.testList(
+                     )).pack(side="top", pady=3)
+        self.test_counter = tk.CTkLabel(self.test_view, text="")
+        self.test_counter.pack(side="top", fill="x", expand=True)
+        self.test_question = tk.CTkLabel(
+            self.test_view, text="", wraplength=500)
+        self.test_question.pack(side="top", fill="x", expand=True)
+        self.test_images_frame = tk.CTkFrame(
+            self.test_view, fg_color="transparent")
+        self.test_images_frame.pack(side="top", fill="x", expand=True)
+        self.test_answers_frame = tk.CTkFrame(
+            self.test_view, fg_color="transparent")
+        self.test_answers_frame.pack(side="top", fill="x", expand=True)
+        self.test_images = []
+        self.test_answers = []
+        # a the bottom of the test view
         tk.CTkButton(self.test_view, text="Next Question", command=lambda: self.nextQuestion(
-        )).pack(side="bottom", fill="both", expand=True, pady=5)
+        )).pack(side="top", fill="both", expand=True, pady=5)
+
+    def _createAnswer(self):
+        variable = tk.IntVar()
+        checkbox = tk.CTkCheckBox(self.test_answers_frame, text="", variable=variable, onvalue=1, offvalue=0
+                                  )
+        return [checkbox, variable]
+
+    def _resizePool(self, pool, count, create):
+        # pool holds [widget, ...] or widgets, the first count of them are shown
+        for i in range(len(pool), count):
+            pool.append(create())
+        for i in range(len(pool)):
+            widget = pool[i][0] if isinstance(pool[i], list) else pool[i]
+            if i < count and not widget.winfo_manager():
+                widget.pack(side="top", fill="x", expand=True)
+            elif i >= count and widget.winfo_manager():
+                widget.pack_forget()
 
     def nextQuestion(self):
         selected = []
         for i in range(len(self.checkboxes)):
             if self.checkboxes[i].get() == 1:
                 selected.append(i)
-        self.deck.updateScore(selected)
-        status = self.deck.nextQuestion()
+        self.session.updateScore(selected)
+        status = self.session.nextQuestion()
         if status == -2:
             self.refreshView
             self.showError("Deck is not loaded? WTF")
@@ -192,15 +354,19 @@ class Gui:
         # windows screen with save file dialog
         # save file dialog
         path = filedialog.asksaveasfilename(defaultextension=".docx", filetypes=(
-            ("Word Document", "*.docx"), ("All Files", "*.*")))
+            ("Word Document", "*.docx"), ("Web Page", "*.html"), ("Markdown", "*.md"),
+            ("JSON Lines", "*.jsonl"), ("All Files", "*.*")))
         if path == "":
             self.showError("No file selected")
             self.testList()
             return
-        exp = docxsave.exportAnki(path)
+        # python-docx is loaded only when it is needed
+        from docxsave import core as docxsave
+        # the format is chosen by the extension of the file
+        exp = docxsave.exportAnki(path, format=docxsave.formatOf(path))
 
         self.deck = self.anki.getDeck(test)
-        status = self.deck.loadCard()
+        status = self.deck.loadCard(wait=False)
         if status == -1:
             self.showError("Deck not found")
             self.testList()
@@ -213,18 +379,73 @@ class Gui:
             self.showError("Deck is not loaded")
             self.testList()
             return
-        questions = self.deck.questions
-        answers = self.deck.answers
-        correct = self.deck.correct
-        images = self.deck.images
-        deckName = self.deck.getDeckName()
-        if len(questions) == 0:
+        if self.deck.getQuestionsNum() == 0:
             self.showError("No questions found")
             self.testList()
             return
 
-        exp.export(questions, answers, correct, deckName, images)
-        self.testList()
+        self.showExportView(self.deck.getDeckName())
+        # the rest of the deck is loaded and exported on a worker thread
+        self.export_cancel = threading.Event()
+        self.export_events = queue.Queue()
+        events = self.export_events
+        threading.Thread(target=self._exportWorker, args=(
+            exp, self.deck, events, self.export_cancel), daemon=True).start()
+        self.window.after(50, lambda: self._pollExport(events))
+
+    def _exportWorker(self, exp, deck, events, cancel):
+        # runs on the worker thread, it must not touch widgets
+        status = False
+        try:
+            status = exp.exportDeck(deck, progress=lambda done, total: events.put(
+                ("progress", done, total)), cancel=cancel)
+        finally:
+            events.put(("done", status))
+
+    def showExportView(self, deckName):
+        self.refreshView()
+        self.export_view = tk.CTkFrame(self.window, width=800, height=600)
+        self.export_view.pack(side="left", fill="both", expand=True)
+        tk.CTkLabel(self.export_view, text="Exporting "+deckName, font=("Arial", 20)).pack(
+            side="top", fill="x", expand=True)
+        self.export_bar = tk.CTkProgressBar(self.export_view)
+        self.export_bar.pack(side="top", fill="x", expand=True)
+        self.export_bar.set(0)
+        self.export_label = tk.CTkLabel(self.export_view, text="")
+        self.export_label.pack(side="top", fill="x", expand=True)
+        tk.CTkButton(self.export_view, text="Cancel", command=lambda: self._cancelExport()).pack(
+            side="top", fill="x", expand=True, pady=5)
+
+    def _cancelExport(self):
+        if self.export_cancel != None:
+            self.export_cancel.set()
+
+    def _pollExport(self, events):
+        if events is not self.export_events:
+            return
+        while True:
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                done, total = event[1], event[2]
+                if self.export_view != None:
+                    if total:
+                        self.export_bar.set(min(done/total, 1))
+                    self.export_label.configure(text=str(
+                        done)+"/"+str(total if total else "?")+" questions")
+                continue
+            cancelled = self.export_cancel.is_set()
+            self.export_events = None
+            self.export_cancel = None
+            self.testList()
+            if cancelled:
+                self.showError("Export cancelled")
+            elif event[1] == False:
+                self.showError("Error while saving file")
+            return
+        self.window.after(50, lambda: self._pollExport(events))
 
     def showScoreScreen(self):
         self.refreshView()
@@ -235,10 +456,10 @@ class Gui:
                      )).pack(side="top", fill="both", expand=True, pady=5)
         self.test_view_score.pack(side="left", fill="both", expand=True)
 
-        score = self.deck.getScore()
-        max = self.deck.getMaxScore()
-        score_precent = self.deck.getScorePercentage()
-        wrongAnswers = self.deck.getWrongQuestions()
+        score = self.session.getScore()
+        max = self.session.getMaxScore()
+        score_precent = self.session.getScorePercentage()
+        wrongAnswers = self.session.getWrongQuestions()
         tk.CTkLabel(self.test_view_score, text="Score: "+str(score)+"/"+str(max) +
                     " ("+str(score_precent)+"%)").pack(side="top", fill="x", expand=True)
         bar = tk.CTkProgressBar(self.test_view_score)
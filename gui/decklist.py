@@ -0,0 +1,250 @@
+import bisect
+import customtkinter as tk
+
+# Height of one row of the list in widget units
+ROW_HEIGHT = 36
+# Delay of the search after the last key press in milliseconds
+SEARCH_DELAY = 120
+
+
+class DeckListModel:
+    def __init__(self, names, counts=None):
+        """Initializes the DeckListModel object.
+
+        The model keeps the search index and the collapsed state of the deck tree, it is
+        built once and reused every time the list is shown.
+
+        Args:
+            names (list): Decks names, subdecks are separated by ::
+            counts (dict, optional): Deck name to number of questions
+        """
+        self.names = list(names)
+        self.counts = counts if counts != None else {}
+        self.lower = [name.lower() for name in self.names]
+        # indexes sorted by lowercase name, for the prefix lookup
+        self.sorted = sorted(range(len(self.names)), key=lambda i: self.lower[i])
+        self.sortedLower = [self.lower[i] for i in self.sorted]
+        self.children = {}
+        known = set(self.names)
+        for name in sorted(self.names, key=lambda name: name.lower()):
+            parent = name.rsplit("::", 1)[0] if "::" in name else None
+            if parent != None and parent not in known:
+                parent = None
+            self.children.setdefault(parent, []).append(name)
+        self.expanded = set()
+        self.query = ""
+        self.lastQuery = None
+        self.lastMatches = None
+
+    def search(self, query) -> list:
+        """Returns the decks whose name contains the query, ignoring case.
+
+        Decks starting with the query are found by binary search in the sorted index and
+        come first. The other decks are scanned, a query extending the previous one only
+        scans the previous matches.
+
+        Args:
+            query (str): Searched text
+
+        Returns:
+            list: Indexes of matching decks in names, decks starting with the query first sorted
+                by name, then the others in the order of names
+        """
+        query = query.lower()
+        prefixed = self.prefix(query)
+        if self.lastQuery != None and query.startswith(self.lastQuery):
+            candidates = sorted(self.lastMatches)
+        else:
+            candidates = range(len(self.names))
+        known = set(prefixed)
+        matches = prefixed+[i for i in candidates if i not in known and query in self.lower[i]]
+        self.lastQuery = query
+        self.lastMatches = matches
+        return matches
+
+    def prefix(self, query) -> list:
+        """Returns the decks whose name starts with the query.
+
+        Args:
+            query (str): Searched prefix, lowercase
+
+        Returns:
+            list: Indexes of matching decks in names, sorted by name
+        """
+        start = bisect.bisect_left(self.sortedLower, query)
+        end = bisect.bisect_left(self.sortedLower, query+"\U0010ffff")
+        return self.sorted[start:end]
+
+    def rows(self) -> list:
+        """Returns the visible rows for the current query and collapsed state.
+
+        Returns:
+            list: [name, text, depth, hasChildren, expanded] for every visible row
+        """
+        if self.query != "":
+            matches = self.search(self.query)
+            return [[self.names[i], self._text(self.names[i], self.names[i]), 0, False, False] for i in matches]
+        rows = []
+        stack = [[name, 0] for name in reversed(self.children.get(None, []))]
+        while len(stack) > 0:
+            name, depth = stack.pop()
+            children = self.children.get(name, [])
+            expanded = name in self.expanded
+            rows.append([name, self._text(name, name.split("::")[-1]),
+                        depth, len(children) > 0, expanded])
+            if expanded:
+                stack.extend([child, depth+1] for child in reversed(children))
+        return rows
+
+    def toggle(self, name):
+        """Expands or collapses the deck.
+
+        Args:
+            name (str): Deck name
+        """
+        if name in self.expanded:
+            self.expanded.remove(name)
+        else:
+            self.expanded.add(name)
+
+    def _text(self, name, label) -> str:
+        """Returns the text of the row.
+
+        Args:
+            name (str): Deck name
+            label (str): Shown name
+
+        Returns:
+            str: Text of the row
+        """
+        if name in self.counts:
+            return f"{label} ({self.counts[name]})"
+        return label
+
+
+class VirtualDeckList(tk.CTkFrame):
+    def __init__(self, master, model, command, **kwargs):
+        """Initializes the VirtualDeckList object.
+
+        Only the rows that fit in the frame have widgets, scrolling changes their content.
+
+        Args:
+            master (widget): Parent widget
+            model (DeckListModel): Decks and their state
+            command (function): Called with the deck name when a deck is chosen
+        """
+        super().__init__(master, **kwargs)
+        self.model = model
+        self.command = command
+        self.offset = 0
+        self.visible = []
+        self.widgets = []
+        self.searchJob = None
+
+        tk.CTkLabel(self, text="Tests", font=("Arial", 20)).pack(
+            side="top", fill="x")
+        self.searchEntry = tk.CTkEntry(self, placeholder_text="Search")
+        self.searchEntry.pack(side="top", fill="x", padx=5, pady=5)
+        if model.query != "":
+            self.searchEntry.insert(0, model.query)
+        self.searchEntry.bind("<KeyRelease>", lambda event: self._scheduleSearch())
+        body = tk.CTkFrame(self, fg_color="transparent")
+        body.pack(side="top", fill="both", expand=True)
+        self.scrollbar = tk.CTkScrollbar(body, command=self._onScrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.rowsFrame = tk.CTkFrame(body, fg_color="transparent")
+        self.rowsFrame.pack(side="left", fill="both", expand=True)
+        # rows must not resize the frame, its size decides the number of rows
+        self.rowsFrame.pack_propagate(False)
+        self.rowsFrame.bind("<Configure>", lambda event: self._resize())
+        for widget in (self, self.rowsFrame):
+            widget.bind("<MouseWheel>", self._onWheel)
+            widget.bind("<Button-4>", lambda event: self.scroll(-3))
+            widget.bind("<Button-5>", lambda event: self.scroll(3))
+        self.refresh()
+
+    def refresh(self):
+        """Recomputes the visible rows and redraws the list.
+        """
+        self.visible = self.model.rows()
+        self.offset = max(0, min(self.offset, len(self.visible)-1))
+        self._redraw()
+
+    def scroll(self, rows):
+        """Scrolls the list.
+
+        Args:
+            rows (int): Number of rows, negative scrolls up
+        """
+        self.offset = max(0, min(self.offset+rows, len(self.visible)-len(self.widgets)))
+        self._redraw()
+
+    def _scheduleSearch(self):
+        if self.searchJob != None:
+            self.after_cancel(self.searchJob)
+        self.searchJob = self.after(SEARCH_DELAY, self._search)
+
+    def _search(self):
+        self.searchJob = None
+        self.model.query = self.searchEntry.get().strip()
+        self.offset = 0
+        self.refresh()
+
+    def _onWheel(self, event):
+        self.scroll(-1 if event.delta > 0 else 1)
+
+    def _onScrollbar(self, *args):
+        if args[0] == "moveto":
+            self.offset = int(float(args[1])*len(self.visible))
+            self.scroll(0)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= max(1, len(self.widgets)-1)
+            self.scroll(step)
+
+    def _resize(self):
+        height = self.rowsFrame.winfo_height()/tk.ScalingTracker.get_widget_scaling(self)
+        count = max(1, int(height//ROW_HEIGHT))
+        if count == len(self.widgets):
+            return
+        while len(self.widgets) < count:
+            self.widgets.append(self._createRow())
+        while len(self.widgets) > count:
+            self.widgets.pop()[0].destroy()
+        self.scroll(0)
+
+    def _createRow(self) -> list:
+        row = tk.CTkFrame(self.rowsFrame, fg_color="transparent",
+                          height=ROW_HEIGHT)
+        toggle = tk.CTkButton(row, text="", width=28, fg_color="transparent")
+        toggle.pack(side="left", padx=(0, 2))
+        button = tk.CTkButton(row, text="", anchor="w")
+        button.pack(side="left", fill="x", expand=True)
+        for widget in (row, toggle, button):
+            widget.bind("<MouseWheel>", self._onWheel)
+            widget.bind("<Button-4>", lambda event: self.scroll(-3))
+            widget.bind("<Button-5>", lambda event: self.scroll(3))
+        return [row, toggle, button]
+
+    def _redraw(self):
+        for i in range(len(self.widgets)):
+            row, toggle, button = self.widgets[i]
+            if self.offset+i >= len(self.visible):
+                if row.winfo_manager():
+                    row.pack_forget()
+                continue
+            name, text, depth, hasChildren, expanded = self.visible[self.offset+i]
+            toggle.configure(text=("▾" if expanded else "▸") if hasChildren else "",
+                             command=(lambda name=name: self._toggle(name)) if hasChildren else None)
+            button.configure(text=text, command=lambda name=name: self.command(name))
+            toggle.pack_configure(padx=(depth*20, 2))
+            if not row.winfo_manager():
+                row.pack(side="top", fill="x", pady=2)
+        total = max(1, len(self.visible))
+        self.scrollbar.set(self.offset/total,
+                           min(1, (self.offset+len(self.widgets))/total))
+
+    def _toggle(self, name):
+        self.model.toggle(name)
+        self.refresh()
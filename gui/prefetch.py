@@ -0,0 +1,116 @@
+from ankidata import trace
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import PIL.Image
+
+
+class PreparedQuestion:
+    def __init__(self, index, question, images):
+        """Initializes the PreparedQuestion object.
+
+        Args:
+            index (int): Position of the question in the session
+            question (str): Question text
+            images (list): [image, size] where image is a decoded PIL image resized to the
+                pixel size and size is its size in widget units
+        """
+        self.index = index
+        self.question = question
+        self.images = images
+
+
+class QuestionPrefetcher:
+    def __init__(self, session, window=2, maxWidth=500, scaling=1.0):
+        """Initializes the QuestionPrefetcher object.
+
+        The prefetcher prepares the next questions of the session on a worker thread, so
+        the UI thread only attaches ready objects.
+
+        Args:
+            session (Session): Session of a loaded deck
+            window (int, optional): Number of questions prepared after the current one. Defaults to 2.
+            maxWidth (int, optional): Maximum width of images in widget units. Defaults to 500.
+            scaling (float, optional): Widget scaling, images are resized to the pixel size. Defaults to 1.0.
+        """
+        self.session = session
+        self.window = window
+        self.maxWidth = maxWidth
+        self.scaling = scaling
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def get(self, index) -> PreparedQuestion:
+        """Returns the prepared question, preparing it now if it was not requested.
+
+        Args:
+            index (int): Position of the question in the session
+
+        Returns:
+            PreparedQuestion: Prepared question
+        """
+        with self.lock:
+            future = self.futures.pop(index, None)
+        if future != None and not future.cancelled():
+            try:
+                return future.result()
+            except Exception:
+                pass
+        return self.prepare(index)
+
+    def request(self, index):
+        """Starts preparing the question and the window of questions after it.
+
+        Questions before index are dropped.
+
+        Args:
+            index (int): Position of the first question to prepare
+        """
+        with self.lock:
+            if self.closed:
+                return
+            for old in [i for i in self.futures if i < index]:
+                self.futures.pop(old).cancel()
+            for i in range(index, index+self.window):
+                if i not in self.futures and i < self.session.getQuestionsNum():
+                    self.futures[i] = self.pool.submit(self.prepare, i)
+
+    def prepare(self, index) -> PreparedQuestion:
+        """Decodes and resizes the images and reads the text of the question.
+
+        Args:
+            index (int): Position of the question in the session
+
+        Returns:
+            PreparedQuestion: Prepared question
+        """
+        with trace.span("QuestionPrefetcher.prepare") as span:
+            question = self.session.deck.questions[self.session.questionIndex(index)]
+            images = []
+            for image in self.session.getImages(index):
+                with image.open() as stream:
+                    img = PIL.Image.open(stream)
+                    img.load()
+                width, height = img.size
+                if width > self.maxWidth:
+                    height = int(height*(self.maxWidth/width))
+                    width = self.maxWidth
+                size = (max(1, int(width*self.scaling)),
+                        max(1, int(height*self.scaling)))
+                if img.size != size:
+                    img = img.resize(size, PIL.Image.Resampling.LANCZOS)
+                images.append([img, (width, height)])
+                span.count("pixels", size[0]*size[1])
+            span.count("images", len(images))
+            return PreparedQuestion(index, question, images)
+
+    def close(self):
+        """Stops the worker thread, pending questions are dropped.
+        """
+        with self.lock:
+            self.closed = True
+            for future in self.futures.values():
+                future.cancel()
+            self.futures = {}
+        self.pool.shutdown(wait=False)
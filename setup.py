@@ -26,6 +26,7 @@ setup(
     entry_points={
         'console_scripts': [
             'StartAnkiTest = start.core:main_function',
+            'ExportAnkiDecks = start.batch:main_function',
         ],
     },
         options={
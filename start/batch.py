@@ -0,0 +1,203 @@
+from ankidata import core as ankidata
+from ankidata import trace
+from docxsave import core as docxsave
+from docxsave.images import ImageStage
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import fnmatch
+import os
+import sys
+import time
+
+# AnkiCore of the worker process, opened once by _initWorker
+_anki = None
+
+
+def _initWorker(collectionPath):
+    """Opens the collection snapshot of the worker process, all workers share one snapshot.
+
+    Args:
+        collectionPath (str): Path of collection.anki2
+    """
+    global _anki
+    # forked workers inherit the spans of the main process
+    trace.reset()
+    _anki = ankidata.AnkiCore(collectionPath=collectionPath, snapshot=True)
+    _anki.Init()
+
+
+def _exportDeck(deckName, outputDir, imageQuality, streaming=False, format="docx", chunkSize=None,
+                inlineImages=False) -> dict:
+    """Exports one deck in the worker process.
+
+    Args:
+        deckName (str): Deck name
+        outputDir (str): Output directory
+        imageQuality (int): JPEG quality of images, None to embed the original images
+        streaming (bool, optional): Write the docx file with StreamingDocxSave. Defaults to False.
+        format (str, optional): Name of a format of docxsave.EXPORTERS. Defaults to "docx".
+        chunkSize (int, optional): Number of questions of every file. Defaults to None, one file.
+        inlineImages (bool, optional): Embed images of text formats as data URIs. Defaults to False.
+
+    Returns:
+        dict: Deck name, path, written files, status, number of questions, time and errors
+    """
+    start = time.perf_counter()
+    path = os.path.join(outputDir, _fileName(deckName)+docxsave.EXPORTERS[format].extension)
+    result = {"deck": deckName, "path": path, "files": [], "status": "ok",
+              "questions": 0, "seconds": 0, "errors": []}
+    try:
+        deck = _anki.getDeck(deckName)
+        status = deck.loadCard(wait=False)
+        if status == -1:
+            result["status"] = "deck not found"
+        elif status == -2:
+            result["status"] = "deck is empty"
+        else:
+            exporter = docxsave.exportAnki(path, ImageStage(quality=imageQuality) if imageQuality != None else None,
+                                           processImages=imageQuality != None, streaming=streaming, format=format,
+                                           chunkSize=chunkSize, inlineImages=inlineImages)
+            if exporter.exportDeck(deck) == False:
+                result["status"] = "error while saving file"
+                if exporter.error != None:
+                    result["status"] += ": "+exporter.error
+            result["files"] = exporter.paths
+        result["questions"] = deck.getQuestionsNum()
+        result["errors"] = deck.getErrors()
+    except Exception as e:
+        result["status"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter()-start
+    if trace.isEnabled():
+        result["trace"] = trace.takeEvents()
+    return result
+
+
+def _fileName(deckName) -> str:
+    """Returns the file name of the exported deck.
+
+    Args:
+        deckName (str): Deck name
+
+    Returns:
+        str: File name without extension
+    """
+    name = deckName.replace("::", "-")
+    for char in ' /\\:*?"<>|':
+        name = name.replace(char, "_")
+    return name
+
+
+def exportDecks(pattern, outputDir, workers=None, collectionPath=None, imageQuality=85, profile=None,
+                streaming=False, format="docx", chunkSize=None, inlineImages=False) -> list:
+    """Exports all decks matching the pattern in parallel worker processes.
+
+    Args:
+        pattern (str): Deck name pattern, * and ? are wildcards
+        outputDir (str): Output directory
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        collectionPath (str, optional): Path of collection.anki2. Defaults to the collection found in the Anki folder.
+        imageQuality (int, optional): JPEG quality of resized images, None to embed the original images. Defaults to 85.
+        profile (str, optional): Anki profile, used when collectionPath is None. Defaults to the profile used last.
+        streaming (bool, optional): Write the docx files with StreamingDocxSave instead of python-docx. Defaults to False.
+        format (str, optional): Name of a format of docxsave.EXPORTERS. Defaults to "docx".
+        chunkSize (int, optional): Number of questions of every file, files are numbered. Defaults to None, one file per deck.
+        inlineImages (bool, optional): Embed images of text formats as data URIs instead of linked files. Defaults to False.
+
+    Returns:
+        list: Result of every deck, see _exportDeck
+        None: if the collection cannot be opened
+    """
+    anki = ankidata.AnkiCore(collectionPath=collectionPath, snapshot=True, profile=profile)
+    status = anki.Init()
+    if status == -4:
+        return []
+    if status != 0:
+        return None
+    decks = [name for name in anki.getDecksNames()
+             if fnmatch.fnmatchcase(name, pattern)]
+    collectionPath = anki.collection.path
+    anki.collection.close()
+
+    os.makedirs(outputDir, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(collectionPath,)) as pool:
+        futures = [pool.submit(_exportDeck, deck, outputDir, imageQuality, streaming,
+                               format, chunkSize, inlineImages) for deck in decks]
+        for future in as_completed(futures):
+            result = future.result()
+            trace.addEvents(result.pop("trace", []))
+            results.append(result)
+    results.sort(key=lambda result: result["deck"])
+    return results
+
+
+def printSummary(results, out=sys.stdout):
+    """Prints the timings and errors of exported decks.
+
+    Args:
+        results (list): Results of exportDecks
+        out (file, optional): Output. Defaults to sys.stdout.
+    """
+    for result in results:
+        print(f"{result['seconds']:8.2f} s {result['questions']:6d} questions  {result['status']:10s} {result['deck']}",
+              file=out)
+    for result in results:
+        if len(result["errors"]) == 0:
+            continue
+        print(f"\nErrors in {result['deck']}:", file=out)
+        for error in result["errors"]:
+            print("  "+error.replace("\n", " "), file=out)
+    failed = len([result for result in results if result["status"] != "ok"])
+    print(f"\nExported {len(results)-failed}/{len(results)} decks in {sum(result['seconds'] for result in results):.2f} s of work",
+          file=out)
+
+
+def main_function():
+    parser = argparse.ArgumentParser(
+        description="Export all decks matching the filter to docx, html, markdown or json lines files")
+    parser.add_argument("output", help="output directory")
+    parser.add_argument("--deck", default="*",
+                        help="deck name filter, * and ? are wildcards (default: all decks)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--collection", default=None,
+                        help="path of collection.anki2 (default: found in the Anki folder)")
+    parser.add_argument("--profile", default=None,
+                        help="Anki profile (default: the profile chosen before, then the profile used last in Anki)")
+    parser.add_argument("--image-quality", type=int, default=85,
+                        help="JPEG quality of images resized to the page width (default: 85)")
+    parser.add_argument("--original-images", action="store_true",
+                        help="embed the original images without resizing")
+    parser.add_argument("--format", choices=list(docxsave.EXPORTERS), default="docx",
+                        help="format of the exported files (default: docx)")
+    parser.add_argument("--chunk-size", type=int, default=None, metavar="N",
+                        help="split every deck into numbered files of N questions")
+    parser.add_argument("--inline-images", action="store_true",
+                        help="embed images of html, md and jsonl files as data URIs instead of linked files")
+    parser.add_argument("--streaming", action="store_true",
+                        help="write the docx files directly instead of with python-docx, faster for large decks")
+    parser.add_argument("--trace", default=None, metavar="PATH",
+                        help="write the timings of every stage to PATH when the export ends")
+    parser.add_argument("--trace-format", choices=trace.FORMATS, default="chrome",
+                        help="chrome trace events or a json summary of stages (default: chrome)")
+    args = parser.parse_args()
+    if args.trace != None:
+        trace.enable(args.trace, args.trace_format)
+        # worker processes started with spawn enable tracing from the environment
+        os.environ[trace.TRACE_ENV] = args.trace
+        os.environ[trace.TRACE_FORMAT_ENV] = args.trace_format
+    results = exportDecks(args.deck, args.output, args.workers, args.collection,
+                          None if args.original_images else args.image_quality, args.profile, args.streaming,
+                          args.format, args.chunk_size, args.inline_images)
+    if results == None:
+        print("Cannot open Anki collection")
+        return 1
+    if len(results) == 0:
+        print("No decks found")
+        return 1
+    printSummary(results)
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_function())
@@ -1,8 +1,26 @@
+from ankidata import core as ankidata
+from ankidata import trace
 from gui.core import Gui
+import argparse
 
 
 def main_function():
-    g = Gui()
+    parser = argparse.ArgumentParser(description="AnkiTest")
+    parser.add_argument("--collection", default=None,
+                        help="path of collection.anki2 (default: collection of the profile)")
+    parser.add_argument("--profile", default=None,
+                        help="Anki profile (default: the profile chosen before, then the profile used last in Anki)")
+    parser.add_argument("--direct", action="store_true",
+                        help="open the collection with the Anki backend instead of a snapshot, Anki must be closed")
+    parser.add_argument("--trace", default=None, metavar="PATH",
+                        help="write the timings of loading, rendering and export to PATH when the program exits")
+    parser.add_argument("--trace-format", choices=trace.FORMATS, default="chrome",
+                        help="chrome trace events or a json summary of stages (default: chrome)")
+    args = parser.parse_args()
+    if args.trace != None:
+        trace.enable(args.trace, args.trace_format)
+    g = Gui(ankidata.AnkiCore(collectionPath=args.collection, profile=args.profile,
+                              snapshot=not args.direct))
 
 
 if __name__ == "__main__":